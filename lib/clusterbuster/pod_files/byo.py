@@ -3,12 +3,73 @@
 import os
 import subprocess
 import json
-import time
 import selectors
 import shutil
 from clusterbuster_pod_client import clusterbuster_pod_client
 
 
+class byo_output:
+    """
+    Collect the stdout of a byo command.  The command may either print
+    a single JSON document, or stream JSON lines of the form
+        {"cb_progress": {...}}
+        {"cb_result": {...}}
+    Progress samples are logged as they arrive and collected with the
+    time since the start of the run; result records are merged into the
+    reported results.  Once any such record is seen, other lines are
+    logged rather than retained.
+    """
+
+    def __init__(self, client: clusterbuster_pod_client, start_time: float):
+        self.client = client
+        self.start_time = start_time
+        self.streaming = False
+        self.lines = []
+        self.progress = []
+        self.result = {}
+
+    def add_line(self, line: str):
+        record = None
+        if line.startswith('{'):
+            try:
+                record = json.loads(line)
+            except json.decoder.JSONDecodeError:
+                pass
+        if isinstance(record, dict) and ('cb_progress' in record or 'cb_result' in record):
+            if not self.streaming:
+                self.streaming = True
+                for prior in self.lines:
+                    self.client._timestamp(prior)
+                self.lines = []
+            if 'cb_progress' in record:
+                self.client._timestamp(f"Progress: {json.dumps(record['cb_progress'])}")
+                self.progress.append({'time': self.client._adjusted_time() - self.start_time,
+                                      'data': record['cb_progress']})
+            if isinstance(record.get('cb_result'), dict):
+                self.result.update(record['cb_result'])
+        elif self.streaming:
+            self.client._timestamp(line)
+        else:
+            self.lines.append(line)
+
+    def results(self, success: bool):
+        answer = '\n'.join(self.lines)
+        if self.streaming:
+            results = self.result
+            if self.progress:
+                results['progress'] = self.progress
+            if not success:
+                results['Status'] = 'FAIL'
+        elif success:
+            try:
+                results = json.loads(answer) if answer else {}
+            except json.decoder.JSONDecodeError as e:
+                results = {'Status': 'FAIL', 'Error': str(e), 'Output': answer}
+        else:
+            results = {'Status': 'FAIL', 'Output': answer}
+        return results
+
+
 class byo_client(clusterbuster_pod_client):
     """
     bring your own workload for clusterbuster
@@ -56,39 +117,46 @@ class byo_client(clusterbuster_pod_client):
                 answer.append(str(arg))
         return answer
 
-    def run_command(self, *cmd):
-        """ Run specified command, capturing stdout and stderr as array of timestamped lines.
-            Optionally fail if return status is non-zero.  Also optionally report
-            stdout and/or stderr to the appropriate file descriptors
+    def run_command(self, *cmd, output: byo_output = None):
+        """ Run specified command, passing each line of stdout to output
+            and logging stderr as timestamped lines.  Output is read in
+            chunks as it becomes available, so progress records are
+            forwarded while the command is still running.
+            :return: True if the command succeeded
         """
         command = self.mk_args(*cmd)
 
         with subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE) as command:
-            stdout_data = []
-
             sel = selectors.DefaultSelector()
-            sel.register(command.stdout, selectors.EVENT_READ)
-            sel.register(command.stderr, selectors.EVENT_READ)
-            while True:
-                # Keep reading until we reach EOF on both channels.
-                # command.poll() is not a good criterion because the process
-                # might complete before everything has been read.
-                foundSomething = False
+            partial = {}
+            for fileobj in [command.stdout, command.stderr]:
+                os.set_blocking(fileobj.fileno(), False)
+                sel.register(fileobj.fileno(), selectors.EVENT_READ, fileobj is command.stdout)
+                partial[fileobj.fileno()] = b''
+            # Keep reading until we reach EOF on both channels.
+            # command.poll() is not a good criterion because the process
+            # might complete before everything has been read.
+            while sel.get_map():
                 for key, _ in sel.select():
-                    data = key.fileobj.readline()
-                    if len(data) > 0:
-                        foundSomething = True
-                        data = data.decode().rstrip()
-                        if key.fileobj is command.stdout:
-                            stdout_data.append(data)
-                        elif key.fileobj is command.stderr:
-                            self._timestamp(data)
-                if not foundSomething:
-                    while command.poll() is None:
-                        time.sleep(1)
-                    if command.poll() != 0:
-                        return False, '\n'.join(stdout_data)
-                    return True, '\n'.join(stdout_data)
+                    try:
+                        data = os.read(key.fd, 65536)
+                    except BlockingIOError:
+                        continue
+                    if data:
+                        lines = (partial[key.fd] + data).split(b'\n')
+                        partial[key.fd] = lines.pop()
+                    else:
+                        sel.unregister(key.fd)
+                        lines = [partial[key.fd]] if partial[key.fd] else []
+                    for line in lines:
+                        line = line.decode(errors='replace').rstrip()
+                        if not key.data:
+                            self._timestamp(line)
+                        elif output:
+                            output.add_line(line)
+            sel.close()
+            # Blocks in waitpid() until the command exits.
+            return command.wait() == 0
 
     def runit(self, process: int):
         os.environ['CB_INDEX'] = str(process)
@@ -97,22 +165,12 @@ class byo_client(clusterbuster_pod_client):
         data_start_time = self._adjusted_time()
         ucpu, scpu = self._cputimes()
         os.chdir(self.workdir)
-        success, answer = self.run_command(self.command, self.args)
+        output = byo_output(self, data_start_time)
+        success = self.run_command(self.command, self.args, output=output)
         data_end_time = self._adjusted_time()
         ucpu, scpu = self._cputimes(ucpu, scpu)
         elapsed_time = data_end_time - data_start_time
-        results = {}
-        if success:
-            try:
-                results = json.loads(answer)
-            except json.decoder.JSONDecodeError as e:
-                results['Status'] = 'FAIL'
-                results['Error'] = str(e)
-                results['Output'] = answer
-        else:
-            results['Status'] = 'FAIL'
-            results['Output'] = answer
-        self._report_results(data_start_time, data_end_time, elapsed_time, ucpu, scpu, results)
+        self._report_results(data_start_time, data_end_time, elapsed_time, ucpu, scpu, output.results(success))
 
 
 byo_client().run_workload()
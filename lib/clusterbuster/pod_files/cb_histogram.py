@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+# Copyright 2023 Robert Krawitz/Red Hat
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from array import array
+
+
+class cb_histogram:
+    """
+    Fixed-memory log-linear latency histogram for ClusterBuster workloads.
+    Values are recorded in integer nanoseconds.  Values below
+    2 ** (sub_bucket_bits + 1) are recorded exactly; above that, each
+    power of two is split into 2 ** sub_bucket_bits linear sub-buckets,
+    so the relative error of any reported value is bounded by
+    2 ** -sub_bucket_bits.  Values above 2 ** max_value_bits are
+    recorded in the last bucket.
+
+    The reporter merges histograms by bucket index, so the bucket
+    layout must stay in sync with ClusterBusterReporter.
+    """
+
+    def __init__(self, sub_bucket_bits: int = 5, max_value_bits: int = 40):
+        self.__sub_bucket_bits = sub_bucket_bits
+        self.__sub_buckets = 1 << sub_bucket_bits
+        self.__max_value = (1 << max_value_bits) - 1
+        self.__counts = array('Q', [0]) * (self.__bucket_index(self.__max_value) + 1)
+        self.__count = 0
+        self.__sum = 0
+        self.__min = None
+        self.__max = 0
+
+    def __bucket_index(self, value: int):
+        shift = value.bit_length() - self.__sub_bucket_bits - 1
+        if shift <= 0:
+            return value
+        return (shift << self.__sub_bucket_bits) + (value >> shift)
+
+    def __bucket_value(self, index: int):
+        """
+        :return: Highest value that maps into the specified bucket
+        """
+        shift = (index >> self.__sub_bucket_bits) - 1
+        if shift <= 0:
+            return index
+        return (((index - (shift << self.__sub_bucket_bits)) + 1) << shift) - 1
+
+    def record_ns(self, value: int, count: int = 1):
+        """
+        Record a value
+        :param value: Value in nanoseconds
+        :param count: Number of times the value was seen
+        """
+        if value < 0:
+            value = 0
+        elif value > self.__max_value:
+            value = self.__max_value
+        self.__counts[self.__bucket_index(value)] += count
+        self.__count += count
+        self.__sum += value * count
+        if self.__min is None or value < self.__min:
+            self.__min = value
+        if value > self.__max:
+            self.__max = value
+
+    def record(self, value: float):
+        """
+        Record one value
+        :param value: Value in seconds
+        """
+        self.record_ns(int(value * 1000000000))
+
+    def count(self):
+        return self.__count
+
+    def percentile(self, pct: float):
+        """
+        :param pct: Percentile (0-100)
+        :return: Value in seconds at the specified percentile, or None if no data
+        """
+        if self.__count == 0:
+            return None
+        target = self.__count * pct / 100.0
+        seen = 0
+        for index in range(len(self.__counts)):
+            seen += self.__counts[index]
+            if seen > 0 and seen >= target:
+                return min(max(self.__bucket_value(index), self.__min), self.__max) / 1000000000.0
+        return self.__max / 1000000000.0
+
+    def as_dict(self):
+        """
+        :return: Compact JSON-serializable representation containing
+                 only the non-empty buckets
+        """
+        return {
+            'sub_bucket_bits': self.__sub_bucket_bits,
+            'count': self.__count,
+            'sum_ns': self.__sum,
+            'min_ns': self.__min if self.__min is not None else 0,
+            'max_ns': self.__max,
+            'buckets': [[index, count] for index, count in enumerate(self.__counts) if count]
+            }
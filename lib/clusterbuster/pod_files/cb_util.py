@@ -284,25 +284,31 @@ class cb_util:
                 retries = retries + 1
             sock.close()
 
-    def _get_port(self, port: int, addr: str = None):
+    def _get_port(self, port: int, addr: str = None, reuse_port: bool = False, sock_type: int = socket.SOCK_STREAM):
         """
         :param addr: address to bind
         :param port: port to bind to
+        :param reuse_port: allow multiple sockets to bind the same port (SO_REUSEPORT)
+        :param sock_type: socket type, default SOCK_STREAM
         :return: socket that we have bound
         """
         if addr is None:
             addr = ''
-        sock = socket.socket()
+        sock = socket.socket(type=sock_type)
+        if reuse_port:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
         sock.bind((addr, port))
         return sock
 
-    def _listen(self, port: int = None, addr: str = None, sock: socket = None, backlog: int = 5):
+    def _listen(self, port: int = None, addr: str = None, sock: socket = None, backlog: int = 5,
+                reuse_port: bool = False):
         """
         Listen on specified port and optoinal address
         :param port: port to listen on.  Either port or sock, but not both, must be provided.
         :param addr: address to listen on, or None for all
         :param sock: socket to listen on.  Either port or sock, but not both, must be provided.
         :param backlog: listen queue length, default 5
+        :param reuse_port: allow multiple sockets to bind the same port (SO_REUSEPORT)
         :return: socket that we are listening on
         """
         if port is None and sock is None:
@@ -312,7 +318,7 @@ class cb_util:
         while True:
             try:
                 if sock is None:
-                    sock = self._get_port(port, addr)
+                    sock = self._get_port(port, addr, reuse_port)
                 sock.listen(backlog)
                 return sock
             except Exception as exc:
@@ -2,9 +2,76 @@
 
 import time
 import random
+import os
 import math
+import errno
+import heapq
+import socket
+import struct
+import selectors
+from collections import deque
 
 from clusterbuster_pod_client import clusterbuster_pod_client
+from cb_histogram import cb_histogram
+
+
+# UDP control sequence numbers; these must match server.py
+UDP_PROBE = 2 ** 64 - 2
+UDP_FIN = 2 ** 64 - 1
+
+
+class client_latency:
+    """
+    Round trip latency accumulator
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.ex = 0
+        self.ex2 = 0
+        self.max = 0
+        self.histogram = cb_histogram()
+
+    def record(self, latency: float):
+        self.count += 1
+        self.ex += latency
+        self.ex2 += latency * latency
+        if latency > self.max:
+            self.max = latency
+        self.histogram.record(latency)
+
+    def mean(self):
+        if self.count > 0:
+            return self.ex / self.count
+        return 0
+
+    def stdev(self):
+        if self.count > 1:
+            return math.sqrt((self.ex2 - (self.ex * self.ex / self.count)) / (self.count - 1))
+        return 0
+
+
+class client_connection:
+    """
+    State of one connection driven by the client selector loop
+    """
+
+    def __init__(self, conn, index: int, connect_start: float = None):
+        self.conn = conn
+        self.index = index
+        self.connect_start = connect_start
+        self.connecting = connect_start is not None
+        self.send_times = deque()
+        self.start_times = deque()
+        self.next_send = 0
+        self.data_sent = 0
+        self.to_send = 0
+        self.send_offset = 0
+        self.received = 0
+        self.writing = False
+        self.timer_pending = False
+        self.done = False
+        self.finished = False
 
 
 class client_client(clusterbuster_pod_client):
@@ -23,49 +90,41 @@ class client_client(clusterbuster_pod_client):
             self.msg_size = self._toSize(self._args[5])
             self.xfertime = self._toSize(self._args[6])
             self.xfertime_max = self._toSize(self._args[7])
+            self.pipeline_depth = max(int(self._args[8]), 1)
+            self.rate_mode = self._args[9]
+            if self.rate_mode not in ['closed', 'constant', 'poisson']:
+                raise ValueError(f"Unknown rate mode {self.rate_mode}")
+            if self.rate_mode != 'closed' and self.data_rate <= 0:
+                raise ValueError(f"Rate mode {self.rate_mode} requires a data rate")
+            self.connections = max(int(self._args[10]), 1)
+            self.protocol = self._args[11]
+            if self.protocol not in ['tcp', 'udp']:
+                raise ValueError(f"Unknown protocol {self.protocol}")
+            self.udp_timeout = float(self._args[12])
+            if self.protocol == 'udp' and (self.msg_size < 8 or self.msg_size > 65507):
+                raise ValueError(f"UDP message size must be between 8 and 65507 bytes, not {self.msg_size}")
         except Exception as err:
             self._abort(f"Init failed! {err} {' '.join(self._args)}")
 
-    def runit(self, process: int):
-        npass = 0
-        ex = 0
-        ex2 = 0
-
-        conn = self._connect_to(self.srvhost, self.connect_port)
-        self._sync_to_controller()
-        msg = b'A' * self.msg_size
-
+    def run_closed_loop(self, conn, latency: client_latency, keep_running, time_overhead: float):
+        """
+        Send one message at a time, waiting for each reply before
+        sending the next.
+        :return: bytes sent
+        """
+        msg = memoryview(b'A' * self.msg_size)
+        recvbuf = memoryview(bytearray(self.msg_size))
         data_sent = 0
-        mean_latency = 0
-        max_latency = 0
-        stdev_latency = 0
-
-        nbytes = self.nbytes
-        xfertime = self.xfertime
-        if nbytes != self.bytes_max:
-            nbytes += random.randint(0, self.bytes_max - nbytes)
-        if xfertime != self.xfertime_max:
-            xfertime += random.randint(0, self.xfertime_max - xfertime)
-
-        user, system = self._cputimes()
-        data_start_time = self._adjusted_time()
-        time_overhead = self._calibrate_time()
-        starttime = data_start_time
-        while (nbytes > 0 and data_sent < bytes) or (xfertime > 0 and self._adjusted_time() - data_start_time < xfertime):
+        starttime = self._adjusted_time()
+        while keep_running(data_sent):
             rtt_start = self._adjusted_time()
-            nleft = self.msg_size
-            while nleft > 0:
-                nwrite = conn.send(msg[(self.msg_size - nleft):])
-                if nwrite > 0:
-                    nleft -= nwrite
-                    data_sent += nwrite
-                else:
-                    raise Exception("Unexpected zero length message sent")
+            conn.sendall(msg)
+            data_sent += self.msg_size
             nleft = self.msg_size
             read_failures = 0
             while nleft > 0:
                 try:
-                    answer = conn.recv(nleft)
+                    nread = conn.recv_into(recvbuf[self.msg_size - nleft:], nleft)
                 except Exception as error:
                     self._timestamp(f"Read failed: {error}")
                     if read_failures > 2:
@@ -73,17 +132,13 @@ class client_client(clusterbuster_pod_client):
                     else:
                         read_failures += 1
                         continue
-                nread = len(answer)
                 read_failures = 0
                 if nread > 0:
                     nleft -= nread
                 else:
                     raise Exception("Unexpected zero length msg received")
             en = self._adjusted_time() - rtt_start - time_overhead
-            ex += en
-            ex2 += en * en
-            if en > max_latency:
-                max_latency = en
+            latency.record(en)
             if self._verbose():
                 self._timestamp('Write/Read %d %.6f' % (self.msg_size, en))
             curtime = self._adjusted_time()
@@ -96,12 +151,324 @@ class client_client(clusterbuster_pod_client):
                 else:
                     if self._verbose():
                         self._timestamp('Not sleeping')
-            npass += 1
+        return data_sent
+
+    def send_interval(self):
+        """
+        :return: Time until the next scheduled message in open loop mode
+        """
+        if self.rate_mode == 'poisson':
+            return random.expovariate(self.data_rate / self.msg_size)
+        return self.msg_size / self.data_rate
+
+    def queue_messages(self, state: client_connection, now: float, keep_running):
+        """
+        Queue as many messages on a connection as its window and pacing allow
+        :return: Time at which more messages may be queued, or None if that
+                 depends only on replies arriving
+        """
+        if state.done:
+            return None
+        if self.rate_mode != 'closed':
+            while now >= state.next_send:
+                if not keep_running(state.data_sent + state.to_send):
+                    state.done = True
+                    return None
+                state.send_times.append(state.next_send)
+                state.to_send += self.msg_size
+                state.next_send += self.send_interval()
+            return state.next_send
+        while len(state.send_times) < self.pipeline_depth and (self.data_rate <= 0 or now >= state.next_send):
+            if not keep_running(state.data_sent + state.to_send):
+                state.done = True
+                return None
+            state.send_times.append(now)
+            state.to_send += self.msg_size
+            if self.data_rate > 0:
+                state.next_send += self.msg_size / self.data_rate
+        if self.data_rate > 0 and len(state.send_times) < self.pipeline_depth:
+            return state.next_send
+        return None
+
+    def run_connections(self, connections: list, latency: client_latency, keep_running, time_overhead: float,
+                        uncorrected_latency: client_latency = None, setup_latency: client_latency = None):
+        """
+        Drive any number of connections from one selector loop.  Each
+        connection keeps up to pipeline_depth messages in flight, with its
+        own pacing; each message's round trip is measured from the time
+        it is queued for sending until its reply has been completely
+        received.  Connections that are still connecting are measured
+        from the start of the connect until the first byte of the first
+        reply (setup_latency).
+
+        In open loop mode, messages are instead queued on a fixed schedule
+        (constant or Poisson arrivals) regardless of how many are in
+        flight.  Latency is then measured from each message's scheduled
+        send time, which accounts for coordinated omission;
+        uncorrected_latency measures from when the message actually
+        started to go out.
+        :return: bytes sent
+        """
+        msg = memoryview(b'A' * self.msg_size)
+        recvbuf = bytearray(self.msg_size * self.pipeline_depth)
+        timers = []
+        sel = selectors.DefaultSelector()
+        active = len(connections)
+
+        def update(state: client_connection, now: float):
+            nonlocal active
+            if state.finished:
+                return
+            wakeup = self.queue_messages(state, now, keep_running)
+            if wakeup is not None and not state.timer_pending:
+                heapq.heappush(timers, (wakeup, state.index, state))
+                state.timer_pending = True
+            if state.done and not state.send_times:
+                sel.unregister(state.conn)
+                state.finished = True
+                active -= 1
+                return
+            writing = state.to_send > 0
+            if writing != state.writing:
+                state.writing = writing
+                sel.modify(state.conn, selectors.EVENT_READ | selectors.EVENT_WRITE if writing else selectors.EVENT_READ,
+                           state)
+
+        now = self._adjusted_time()
+        for state in connections:
+            state.conn.setblocking(False)
+            if state.connecting:
+                sel.register(state.conn, selectors.EVENT_WRITE, state)
+                state.writing = True
+            else:
+                # Don't let Nagle's algorithm hold back messages behind unacknowledged ones
+                state.conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                sel.register(state.conn, selectors.EVENT_READ, state)
+                state.next_send = now
+                update(state, now)
+        while active > 0:
+            now = self._adjusted_time()
+            while timers and timers[0][0] <= now:
+                wakeup, index, state = heapq.heappop(timers)
+                state.timer_pending = False
+                update(state, now)
+            if active == 0:
+                break
+            timeout = 1
+            if timers:
+                timeout = min(max(timers[0][0] - now, 0), timeout)
+            # The selector rounds timeouts up to whole milliseconds, which
+            # would make sends late; finish short waits with sleep instead.
+            if timeout > 0.001:
+                events = sel.select(timeout - 0.001)
+            else:
+                events = sel.select(0)
+                if not events and timeout > 0:
+                    time.sleep(timeout)
+            for key, mask in events:
+                state = key.data
+                conn = state.conn
+                if state.connecting:
+                    error = conn.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                    if error:
+                        raise Exception(f"Connect failed: {os.strerror(error)}")
+                    state.connecting = False
+                    conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                    sel.modify(conn, selectors.EVENT_READ, state)
+                    state.writing = False
+                    state.next_send = self._adjusted_time()
+                    update(state, state.next_send)
+                    continue
+                if mask & selectors.EVENT_WRITE:
+                    try:
+                        while state.to_send > 0:
+                            nwrite = conn.send(msg[state.send_offset:
+                                                   state.send_offset + min(state.to_send, self.msg_size - state.send_offset)])
+                            if nwrite > 0 and state.send_offset == 0:
+                                state.start_times.append(self._adjusted_time())
+                            state.to_send -= nwrite
+                            state.data_sent += nwrite
+                            state.send_offset = (state.send_offset + nwrite) % self.msg_size
+                    except BlockingIOError:
+                        pass
+                if mask & selectors.EVENT_READ:
+                    try:
+                        nread = conn.recv_into(recvbuf)
+                    except BlockingIOError:
+                        nread = None
+                    if nread == 0:
+                        raise Exception("Unexpected zero length msg received")
+                    if nread:
+                        now = self._adjusted_time()
+                        if state.connect_start is not None and setup_latency:
+                            setup_latency.record(now - state.connect_start - time_overhead)
+                            state.connect_start = None
+                        state.received += nread
+                        while state.received >= self.msg_size and state.send_times:
+                            state.received -= self.msg_size
+                            en = now - state.send_times.popleft() - time_overhead
+                            latency.record(en)
+                            start_time = state.start_times.popleft()
+                            if uncorrected_latency:
+                                uncorrected_latency.record(now - start_time - time_overhead)
+                            if self._verbose():
+                                self._timestamp('Write/Read %d %.6f' % (self.msg_size, en))
+                update(state, self._adjusted_time())
+        sel.close()
+        for state in connections:
+            state.conn.setblocking(True)
+        return sum([state.data_sent for state in connections])
+
+    def open_connection(self, index: int):
+        """
+        Start a non-blocking connection to the server
+        :return: client_connection for the connection in progress
+        """
+        conn = socket.socket(family=socket.AF_INET, type=socket.SOCK_STREAM)
+        conn.setblocking(False)
+        connect_start = self._adjusted_time()
+        error = conn.connect_ex((self.srvhost, self.connect_port))
+        if error not in [0, errno.EINPROGRESS]:
+            raise Exception(f"Connect to {self.srvhost}:{self.connect_port} failed: {os.strerror(error)}")
+        return client_connection(conn, index, connect_start)
+
+    def udp_control(self, sock, server: tuple, seq: int, attempts: int = None):
+        """
+        Send a UDP control message and wait for the server to echo it
+        :return: True if the server echoed the message
+        """
+        buf = bytearray(self.msg_size)
+        struct.pack_into('!Q', buf, 0, seq)
+        sock.settimeout(1)
+        attempt = 0
+        while attempts is None or attempt < attempts:
+            attempt += 1
+            sock.sendto(buf, server)
+            try:
+                while True:
+                    nbytes, address = sock.recvfrom_into(buf)
+                    if nbytes >= 8 and struct.unpack_from('!Q', buf)[0] == seq:
+                        return True
+            except socket.timeout:
+                pass
+            except OSError:
+                # Typically ECONNREFUSED from an earlier datagram when the
+                # server is not yet listening
+                time.sleep(1)
+            if attempt == 1 or attempt % 10 == 0:
+                self._timestamp(f"No UDP response from {server[0]}:{server[1]} after {attempt} attempt(s)")
+        return False
+
+    def run_udp(self, sock, server: tuple, latency: client_latency, keep_running, time_overhead: float):
+        """
+        Send one datagram at a time, each stamped with a sequence number,
+        and wait up to udp_timeout for the server to echo it.  Datagrams
+        with no reply within the timeout, or whose receive fails (e. g.
+        with ECONNREFUSED from an ICMP port unreachable), are counted as
+        lost; replies to earlier datagrams that arrive after their timeout
+        are counted as late and otherwise ignored, as are stray echoes of
+        control messages.
+        :return: bytes sent, dict of packet statistics
+        """
+        sendbuf = bytearray(self.msg_size)
+        recvbuf = bytearray(self.msg_size)
+        data_sent = 0
+        seq = 0
+        lost = 0
+        late = 0
+        starttime = self._adjusted_time()
+        while keep_running(data_sent):
+            seq += 1
+            struct.pack_into('!Q', sendbuf, 0, seq)
+            rtt_start = self._adjusted_time()
+            sock.sendto(sendbuf, server)
+            data_sent += self.msg_size
+            deadline = rtt_start + self.udp_timeout
+            while True:
+                remaining = deadline - self._adjusted_time()
+                if remaining <= 0:
+                    lost += 1
+                    break
+                sock.settimeout(remaining)
+                try:
+                    nbytes, address = sock.recvfrom_into(recvbuf)
+                except OSError:
+                    # Includes socket.timeout
+                    lost += 1
+                    break
+                reply_seq = struct.unpack_from('!Q', recvbuf)[0] if nbytes >= 8 else None
+                if reply_seq == seq:
+                    en = self._adjusted_time() - rtt_start - time_overhead
+                    latency.record(en)
+                    if self._verbose():
+                        self._timestamp('Send/Receive %d %.6f' % (self.msg_size, en))
+                    break
+                if reply_seq not in (UDP_PROBE, UDP_FIN):
+                    late += 1
+            if self.data_rate > 0:
+                starttime += self.msg_size / self.data_rate
+                curtime = self._adjusted_time()
+                if curtime < starttime:
+                    time.sleep(starttime - curtime)
+        return data_sent, {
+            'packets_sent': seq,
+            'packets_received': latency.count,
+            'packets_lost': lost,
+            'packets_late': late
+            }
+
+    def runit(self, process: int):
+        if self.protocol == 'udp':
+            conn = socket.socket(family=socket.AF_INET, type=socket.SOCK_DGRAM)
+            server = (self.srvhost, self.connect_port)
+        else:
+            # The first connection also waits for the server to be ready
+            conn = self._connect_to(self.srvhost, self.connect_port)
+        self._sync_to_controller()
+        if self.protocol == 'udp':
+            # The server only starts answering once it has synced
+            self.udp_control(conn, server, UDP_PROBE)
+        latency = client_latency()
+
+        nbytes = self.nbytes
+        xfertime = self.xfertime
+        if nbytes != self.bytes_max:
+            nbytes += random.randint(0, self.bytes_max - nbytes)
+        if xfertime != self.xfertime_max:
+            xfertime += random.randint(0, self.xfertime_max - xfertime)
+
+        user, system = self._cputimes()
+        data_start_time = self._adjusted_time()
+        time_overhead = self._calibrate_time()
+
+        def keep_running(data_sent: int):
+            return ((nbytes > 0 and data_sent < nbytes) or
+                    (xfertime > 0 and self._adjusted_time() - data_start_time < xfertime))
+
+        uncorrected_latency = None
+        setup_latency = None
+        udp_stats = None
+        if self.rate_mode != 'closed':
+            uncorrected_latency = client_latency()
+        if self.protocol == 'udp':
+            data_sent, udp_stats = self.run_udp(conn, server, latency, keep_running, time_overhead)
+        elif self.rate_mode != 'closed' or self.pipeline_depth > 1 or self.connections > 1:
+            connections = [client_connection(conn, 0)]
+            if self.connections > 1:
+                setup_latency = client_latency()
+                connections.extend([self.open_connection(i) for i in range(1, self.connections)])
+            data_sent = self.run_connections(connections, latency, keep_running, time_overhead,
+                                             uncorrected_latency, setup_latency)
+            # As below, the connections must be closed before reporting
+            for state in connections:
+                state.conn.close()
+        else:
+            data_sent = self.run_closed_loop(conn, latency, keep_running, time_overhead)
+            # Servers that report their own results (epoll mode) only do so
+            # once all clients have closed their connections, so that must
+            # happen before waiting at the result barrier.
+            conn.close()
         data_end_time = self._adjusted_time()
-        if npass > 0:
-            mean_latency = ex / npass
-            if npass > 1:
-                stdev_latency = math.sqrt((ex2 - (ex * ex / npass)) / (npass - 1))
 
         user, system = self._cputimes(user, system)
         elapsed_time = data_end_time - data_start_time
@@ -109,14 +476,46 @@ class client_client(clusterbuster_pod_client):
             elapsed_time = 0.00000001
         extra = {
             'data_sent_bytes': data_sent,
-            'mean_latency_sec': mean_latency,
-            'max_latency_sec': max_latency,
-            'stdev_latency_sec': stdev_latency,
+            'mean_latency_sec': latency.mean(),
+            'max_latency_sec': latency.max,
+            'stdev_latency_sec': latency.stdev(),
+            'p50_latency_sec': latency.histogram.percentile(50),
+            'p90_latency_sec': latency.histogram.percentile(90),
+            'p99_latency_sec': latency.histogram.percentile(99),
+            'p999_latency_sec': latency.histogram.percentile(99.9),
+            'p9999_latency_sec': latency.histogram.percentile(99.99),
+            'latency': latency.histogram.as_dict(),
             'timing_overhead_sec': time_overhead,
             'target_self.data_rate': self.data_rate,
-            'passes': npass,
-            'self.msg_size': self.msg_size
+            'passes': latency.count,
+            'self.msg_size': self.msg_size,
+            'pipeline_depth': self.pipeline_depth,
+            'rate_mode': self.rate_mode,
+            'protocol': self.protocol,
+            'connections': self.connections,
+            'target_message_rate': self.data_rate * self.connections / self.msg_size,
+            'achieved_message_rate': latency.count / elapsed_time
         }
+        if uncorrected_latency:
+            extra['uncorrected_mean_latency_sec'] = uncorrected_latency.mean()
+            extra['uncorrected_max_latency_sec'] = uncorrected_latency.max
+            extra['uncorrected_p50_latency_sec'] = uncorrected_latency.histogram.percentile(50)
+            extra['uncorrected_p90_latency_sec'] = uncorrected_latency.histogram.percentile(90)
+            extra['uncorrected_p99_latency_sec'] = uncorrected_latency.histogram.percentile(99)
+            extra['uncorrected_p999_latency_sec'] = uncorrected_latency.histogram.percentile(99.9)
+            extra['uncorrected_p9999_latency_sec'] = uncorrected_latency.histogram.percentile(99.99)
+            extra['uncorrected_latency'] = uncorrected_latency.histogram.as_dict()
+        if udp_stats:
+            if not self.udp_control(conn, server, UDP_FIN, 10):
+                self._timestamp("Server did not acknowledge end of run")
+            conn.close()
+            udp_stats['packet_loss_rate'] = udp_stats['packets_lost'] / max(udp_stats['packets_sent'], 1)
+            udp_stats['packet_rate'] = udp_stats['packets_received'] / elapsed_time
+            extra.update(udp_stats)
+        if setup_latency:
+            extra['setup_mean_latency_sec'] = setup_latency.mean()
+            extra['setup_max_latency_sec'] = setup_latency.max
+            extra['setup_latency'] = setup_latency.histogram.as_dict()
         self._report_results(data_start_time, data_end_time, data_end_time - data_start_time, user, system, extra)
 
 
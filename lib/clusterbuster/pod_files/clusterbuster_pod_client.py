@@ -33,6 +33,7 @@ class clusterbuster_pod_client(cb_util):
 
     def __init__(self, initialize_timing_if_needed: bool = True, argv: list = sys.argv, external_sync_only: bool = False):
         super().__init__(no_timestamp=external_sync_only)
+        self.__drop_cache_stats = {'requests': 0, 'drops': 0, 'wait_time': 0, 'longest_wait_time': 0, 'drop_time': 0}
         if external_sync_only:
             self.__synchost = os.environ.get('__CB_SYNCHOST')
             self.__syncport = int(os.environ.get('__CB_SYNCPORT'))
@@ -219,10 +220,33 @@ class clusterbuster_pod_client(cb_util):
         subprocess.run('sync')
         self._timestamp("Dropping host cache")
         if self.__drop_cache_host and self.__drop_cache_port:
+            start_time = time.time()
             with self._connect_to(self.__drop_cache_host, self.__drop_cache_port) as sock:
                 self._timestamp(f"    Connected to {self.__drop_cache_host}:{self.__drop_cache_port}")
-                sock.recv(1)
-                self._timestamp("    Confirmed")
+                # The service acks with a line describing the drop once it
+                # completes, and then closes the connection.
+                ack = b''
+                while True:
+                    data = sock.recv(1024)
+                    if not data:
+                        break
+                    ack += data
+            wait_time = time.time() - start_time
+            stats = self.__drop_cache_stats
+            stats['requests'] += 1
+            stats['wait_time'] += wait_time
+            stats['longest_wait_time'] = max(stats['longest_wait_time'], wait_time)
+            try:
+                ack = json.loads(ack)
+                # Each of the coalesced requests is credited with its
+                # share of the drop, so that the shares sum to the
+                # number of drops performed.
+                stats['drops'] += 1 / ack['coalesced_requests']
+                stats['drop_time'] += ack['drop_time']
+                self._timestamp(f"    Confirmed after {wait_time:.3f} sec: drop {ack['drop']} took {ack['drop_time']:.3f} sec "
+                                f"for {ack['coalesced_requests']} requests")
+            except Exception:
+                self._timestamp(f"    Confirmed after {wait_time:.3f} sec")
 
     def _podname(self):
         """
@@ -283,6 +307,8 @@ class clusterbuster_pod_client(cb_util):
             'cpu_time': user_cpu + sys_cpu,
             'timing_parameters': self.__timing_parameters
             }
+        if self.__drop_cache_stats['requests']:
+            answer['drop_cache'] = self.__drop_cache_stats
         if isinstance(extra, dict):
             for key, val in extra.items():
                 answer[key] = val
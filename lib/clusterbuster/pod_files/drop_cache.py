@@ -1,35 +1,87 @@
 #!/usr/bin/env python3
 
 import os
+import json
+import time
 from clusterbuster_pod_client import clusterbuster_pod_client
 
 
 class drop_cache_client(clusterbuster_pod_client):
     """
-    Drop buffer cache and if needed host cache
+    Drop buffer cache and if needed host cache.
+
+    Requests are coalesced: every request that arrives while a drop is
+    in progress waits for the next drop, and all such requests are
+    satisfied by that one sync and drop.  A request that arrives after
+    a drop has started cannot be satisfied by it, as data written by
+    the requester may not have been synced.  Each caller is acked
+    after its drop completes with a JSON line reporting the drop.
     """
     def __init__(self):
         try:
             super().__init__(initialize_timing_if_needed=False)
             self.listen_port = self._get_drop_cache_port()
+            self.drops = 0
+            self.requests = 0
         except Exception as err:
             self._abort(f"Init failed! {err} {' '.join(self._args)}")
 
+    def accept_pending(self, sock, batch: list):
+        """
+        Accept all connections already queued on the listen socket
+        """
+        sock.setblocking(False)
+        try:
+            while True:
+                conn, address = sock.accept()
+                batch.append([conn, time.time()])
+        except BlockingIOError:
+            pass
+        finally:
+            sock.setblocking(True)
+
+    def drop_cache(self):
+        self._timestamp("About to sync()")
+        os.sync()
+        self._timestamp("About to drop cache")
+        try:
+            with open("/proc/sys/vm/drop_caches", 'w') as drop_cache:
+                print('3', file=drop_cache)
+            self._timestamp("Successfully dropped cache")
+            return True
+        except Exception as exc:
+            self._timestamp(f"Cannot write to /proc/sys/vm/drop_caches: {exc}")
+            return False
+
     def runit(self, process: int):
-        sock = self._listen(port=self.listen_port, backlog=128)
+        sock = self._listen(port=self.listen_port, backlog=1024)
         while True:
             try:
                 conn, address = sock.accept()
-                self._timestamp(f"Accepted connection from {address}, about to sync()")
-                os.sync()
-                self._timestamp("About to drop cache")
-                try:
-                    with open("/proc/sys/vm/drop_caches", 'w') as drop_cache:
-                        print('3', file=drop_cache)
-                    self._timestamp("Successfully dropped cache")
-                except Exception as exc:
-                    self._timestamp(f"Cannot write to /proc/sys/vm/drop_caches: {exc}")
-                conn.close()
+                batch = [[conn, time.time()]]
+                # Anything that queued up during the previous drop is
+                # satisfied by this one.
+                self.accept_pending(sock, batch)
+                start_time = time.time()
+                dropped = self.drop_cache()
+                end_time = time.time()
+                self.drops += 1
+                self.requests += len(batch)
+                self._timestamp(f"Drop {self.drops} satisfied {len(batch)} requests in {end_time - start_time:.3f} sec"
+                                f" ({self.requests} requests in {self.drops} drops)")
+                for conn, arrival_time in batch:
+                    ack = {
+                        'drop': self.drops,
+                        'dropped': dropped,
+                        'drop_time': end_time - start_time,
+                        'queue_time': start_time - arrival_time,
+                        'coalesced_requests': len(batch)
+                        }
+                    try:
+                        conn.sendall((json.dumps(ack) + '\n').encode())
+                    except Exception:
+                        pass
+                    conn.close()
             except Exception:
                 pass
 
@@ -5,8 +5,10 @@ import time
 import subprocess
 import mmap
 import shutil
+import random
 
 from clusterbuster_pod_client import clusterbuster_pod_client
+from cb_histogram import cb_histogram
 
 
 class files_client(clusterbuster_pod_client):
@@ -17,8 +19,8 @@ class files_client(clusterbuster_pod_client):
     def __init__(self):
         try:
             super().__init__()
-            if len(self._args) > 6:
-                self.dir_list = self._args[6:]
+            if len(self._args) > 11:
+                self.dir_list = self._args[11:]
             else:
                 self.dir_list = ['/tmp']
             self.dirs = self._toSize(self._args[0])
@@ -30,45 +32,139 @@ class files_client(clusterbuster_pod_client):
             self.flags = 0
             if self.o_direct:
                 self.flags = os.O_DIRECT
+            self.use_dirfd = self._toBool(self._args[6])
+            # Precompute names so that the dirfd loops don't format strings per operation
+            self.dir_names = [str(subdir) for subdir in range(self.dirs)]
+            self.file_names = [str(fileidx) for fileidx in range(self.files_per_dir)]
+            self.phase_sleep = float(self._args[7])
+            self.mixed_duration = float(self._args[8])
+            self.mix_ops = ['create', 'read', 'stat', 'remove']
+            self.mix = dict.fromkeys(self.mix_ops, 0.0)
+            for item in self._splitStr(r'[,\s]+', self._args[9]):
+                op, weight = item.split('=', 1)
+                if op not in self.mix:
+                    raise ValueError(f"Unknown mixed operation {op}")
+                self.mix[op] = float(weight)
+            if self.mixed_duration > 0 and sum(self.mix.values()) <= 0:
+                raise ValueError("At least one mixed operation must have a positive weight")
+            self.mixed_interval = float(self._args[10])
+            if self.mixed_interval <= 0:
+                self.mixed_interval = self.mixed_duration
         except Exception as err:
             self._abort(f"Init failed! {err} {' '.join(self._args)}")
 
-    def remdir(self, dirname: str, oktofail: bool = False):
+    def remdir(self, dirname: str, oktofail: bool = False, rmdir_lat: cb_histogram = None):
         try:
+            start = time.perf_counter_ns()
             os.rmdir(dirname)
+            if rmdir_lat:
+                rmdir_lat.record_ns(time.perf_counter_ns() - start)
         except Exception as err:
             if oktofail:
                 shutil.rmtree(dirname, ignore_errors=True)
             else:
                 raise err
 
-    def makethem(self, pid: int):
+    def makethem(self, pid: int, latency: dict):
         buf = mmap.mmap(-1, self.blocksize)
         buf.write(b'a' * self.blocksize)
         ops = 0
+        clock = time.perf_counter_ns
+        mkdir_lat = latency['mkdir'] = cb_histogram()
+        open_lat = latency['open'] = cb_histogram()
+        write_lat = latency['write'] = cb_histogram()
+        close_lat = latency['close'] = cb_histogram()
         for bdir in self.dir_list:
             direc = f"{bdir}/p{pid}/{self._container()}"
+            start = clock()
             os.makedirs(direc)
+            mkdir_lat.record_ns(clock() - start)
             ops = ops + 2
             for subdir in range(self.dirs):
                 dirname = f"{direc}/{subdir}"
+                start = clock()
                 os.mkdir(dirname)
+                mkdir_lat.record_ns(clock() - start)
                 ops = ops + 1
                 for fileidx in range(self.files_per_dir):
                     filename = f"{dirname}/{fileidx}"
+                    start = clock()
                     fd = os.open(filename, self.flags | os.O_WRONLY | os.O_CREAT)
+                    open_lat.record_ns(clock() - start)
                     ops = ops + 1
                     for block in range(self.block_count):
+                        start = clock()
                         answer = os.write(fd, buf)
+                        write_lat.record_ns(clock() - start)
                         if answer != self.blocksize:
                             raise os.IOError(f"Incomplete write to {filename}: {answer} bytes, expect {self.blocksize}")
                         ops = ops + 1
+                    start = clock()
                     os.close(fd)
+                    close_lat.record_ns(clock() - start)
         return ops
 
-    def readthem(self, pid: int, oktofail: bool = False):
+    def makethem_dirfd(self, pid: int, latency: dict):
+        """
+        Create files relative to open directory file descriptors,
+        so the kernel does not resolve the full path on every operation.
+        """
+        buf = mmap.mmap(-1, self.blocksize)
+        buf.write(b'a' * self.blocksize)
+        ops = 0
+        clock = time.perf_counter_ns
+        flags = self.flags | os.O_WRONLY | os.O_CREAT
+        dir_flags = os.O_RDONLY | os.O_DIRECTORY
+        blocksize = self.blocksize
+        block_count = self.block_count
+        mkdir_lat = latency['mkdir'] = cb_histogram()
+        open_lat = latency['open'] = cb_histogram()
+        write_lat = latency['write'] = cb_histogram()
+        close_lat = latency['close'] = cb_histogram()
+        for bdir in self.dir_list:
+            direc = f"{bdir}/p{pid}/{self._container()}"
+            start = clock()
+            os.makedirs(direc)
+            mkdir_lat.record_ns(clock() - start)
+            ops = ops + 2
+            dfd = os.open(direc, dir_flags)
+            try:
+                for dirname in self.dir_names:
+                    start = clock()
+                    os.mkdir(dirname, dir_fd=dfd)
+                    mkdir_lat.record_ns(clock() - start)
+                    ops = ops + 1
+                    sfd = os.open(dirname, dir_flags, dir_fd=dfd)
+                    try:
+                        for filename in self.file_names:
+                            start = clock()
+                            fd = os.open(filename, flags, dir_fd=sfd)
+                            open_lat.record_ns(clock() - start)
+                            ops = ops + 1
+                            for block in range(block_count):
+                                start = clock()
+                                answer = os.write(fd, buf)
+                                write_lat.record_ns(clock() - start)
+                                if answer != blocksize:
+                                    raise IOError(f"Incomplete write to {direc}/{dirname}/{filename}: "
+                                                  f"{answer} bytes, expect {blocksize}")
+                                ops = ops + 1
+                            start = clock()
+                            os.close(fd)
+                            close_lat.record_ns(clock() - start)
+                    finally:
+                        os.close(sfd)
+            finally:
+                os.close(dfd)
+        return ops
+
+    def readthem(self, pid: int, latency: dict, oktofail: bool = False):
         dbuf = ''
         ops = 0
+        clock = time.perf_counter_ns
+        open_lat = latency['open'] = cb_histogram()
+        read_lat = latency['read'] = cb_histogram()
+        close_lat = latency['close'] = cb_histogram()
         for bdir in self.dir_list:
             direc = f"{bdir}/p{pid}/{self._container()}"
             ops = ops + 2
@@ -79,27 +175,94 @@ class files_client(clusterbuster_pod_client):
                     filename = f"{dirname}/{fileidx}"
                     try:
                         if self.o_direct and self.block_count > 0 and self.blocksize > 0:
+                            start = clock()
                             fd = os.open(filename, self.flags | os.O_RDONLY)
+                            open_lat.record_ns(clock() - start)
                             ops = ops + 1
                             with mmap.mmap(fd, 0, prot=mmap.PROT_READ) as mm:
                                 for block in range(self.block_count):
+                                    start = clock()
                                     tmp = mm.read(self.blocksize)
+                                    read_lat.record_ns(clock() - start)
                                     dbuf += str(tmp[-1:])
                                     ops = ops + 1
+                            start = clock()
                             os.close(fd)
+                            close_lat.record_ns(clock() - start)
                         else:
-                            with open(filename) as file:
-                                ops = ops + 1
+                            start = clock()
+                            file = open(filename)
+                            open_lat.record_ns(clock() - start)
+                            ops = ops + 1
+                            try:
                                 for block in range(self.block_count):
+                                    start = clock()
                                     file.read(self.blocksize)
+                                    read_lat.record_ns(clock() - start)
                                     ops = ops + 1
+                            finally:
+                                start = clock()
+                                file.close()
+                                close_lat.record_ns(clock() - start)
                     except Exception as exc:
                         if not oktofail:
                             raise exc
         return ops
 
-    def removethem(self, pid: int, oktofail: bool = False):
+    def readthem_dirfd(self, pid: int, latency: dict):
+        """
+        Read files relative to open directory file descriptors into a
+        single preallocated, page-aligned buffer (suitable for O_DIRECT).
+        """
+        buf = mmap.mmap(-1, max(self.blocksize, 1))
+        bufs = [buf]
+        ops = 0
+        clock = time.perf_counter_ns
+        flags = self.flags | os.O_RDONLY
+        dir_flags = os.O_RDONLY | os.O_DIRECTORY
+        blocksize = self.blocksize
+        block_count = self.block_count
+        open_lat = latency['open'] = cb_histogram()
+        read_lat = latency['read'] = cb_histogram()
+        close_lat = latency['close'] = cb_histogram()
+        for bdir in self.dir_list:
+            direc = f"{bdir}/p{pid}/{self._container()}"
+            ops = ops + 2
+            dfd = os.open(direc, dir_flags)
+            try:
+                for dirname in self.dir_names:
+                    ops = ops + 1
+                    sfd = os.open(dirname, dir_flags, dir_fd=dfd)
+                    try:
+                        for filename in self.file_names:
+                            start = clock()
+                            fd = os.open(filename, flags, dir_fd=sfd)
+                            open_lat.record_ns(clock() - start)
+                            ops = ops + 1
+                            try:
+                                for block in range(block_count):
+                                    start = clock()
+                                    answer = os.readv(fd, bufs)
+                                    read_lat.record_ns(clock() - start)
+                                    if answer != blocksize:
+                                        raise IOError(f"Incomplete read from {direc}/{dirname}/{filename}: "
+                                                      f"{answer} bytes, expect {blocksize}")
+                                    ops = ops + 1
+                            finally:
+                                start = clock()
+                                os.close(fd)
+                                close_lat.record_ns(clock() - start)
+                    finally:
+                        os.close(sfd)
+            finally:
+                os.close(dfd)
+        return ops
+
+    def removethem(self, pid: int, latency: dict, oktofail: bool = False):
         ops = 0
+        clock = time.perf_counter_ns
+        unlink_lat = latency['unlink'] = cb_histogram()
+        rmdir_lat = latency['rmdir'] = cb_histogram()
         for bdir in self.dir_list:
             pdir = f"{bdir}/p{pid}"
             if oktofail and not self._isdir(pdir):
@@ -115,22 +278,209 @@ class files_client(clusterbuster_pod_client):
                     filename = f"{dirname}/{fileidx}"
                     if oktofail and not self._isfile(filename):
                         continue
+                    start = clock()
                     os.unlink(filename)
+                    unlink_lat.record_ns(clock() - start)
                     ops = ops + 1
-                self.remdir(dirname, oktofail)
+                self.remdir(dirname, oktofail, rmdir_lat)
                 ops = ops + 1
-            self.remdir(direc, oktofail)
+            self.remdir(direc, oktofail, rmdir_lat)
+            ops = ops + 1
+            self.remdir(pdir, oktofail, rmdir_lat)
+            ops = ops + 1
+        return ops
+
+    def removethem_dirfd(self, pid: int, latency: dict):
+        """
+        Remove files and directories relative to open directory file descriptors.
+        """
+        ops = 0
+        clock = time.perf_counter_ns
+        dir_flags = os.O_RDONLY | os.O_DIRECTORY
+        unlink_lat = latency['unlink'] = cb_histogram()
+        rmdir_lat = latency['rmdir'] = cb_histogram()
+        for bdir in self.dir_list:
+            pdir = f"{bdir}/p{pid}"
+            direc = f"{pdir}/{self._container()}"
+            dfd = os.open(direc, dir_flags)
+            try:
+                for dirname in self.dir_names:
+                    sfd = os.open(dirname, dir_flags, dir_fd=dfd)
+                    try:
+                        for filename in self.file_names:
+                            start = clock()
+                            os.unlink(filename, dir_fd=sfd)
+                            unlink_lat.record_ns(clock() - start)
+                            ops = ops + 1
+                    finally:
+                        os.close(sfd)
+                    start = clock()
+                    os.rmdir(dirname, dir_fd=dfd)
+                    rmdir_lat.record_ns(clock() - start)
+                    ops = ops + 1
+            finally:
+                os.close(dfd)
+            self.remdir(direc, False, rmdir_lat)
             ops = ops + 1
-            self.remdir(pdir, oktofail)
+            self.remdir(pdir, False, rmdir_lat)
             ops = ops + 1
         return ops
 
+    def mixed_setup(self, pid: int):
+        """
+        Create the directories for the mixed workload and populate half
+        of the working set, so that every operation in the mix can run
+        from the start.
+        """
+        dir_flags = os.O_RDONLY | os.O_DIRECTORY
+        self.mix_dfds = []
+        self.mix_sfds = []
+        for bdir in self.dir_list:
+            direc = f"{bdir}/p{pid}/{self._container()}"
+            os.makedirs(direc)
+            dfd = os.open(direc, dir_flags)
+            self.mix_dfds.append((direc, dfd))
+            for dirname in self.dir_names:
+                os.mkdir(dirname, dir_fd=dfd)
+                self.mix_sfds.append((dfd, dirname, os.open(dirname, dir_flags, dir_fd=dfd)))
+        self.mix_slots = [(sfd, filename) for dfd, dirname, sfd in self.mix_sfds for filename in self.file_names]
+        self.mix_absent = list(range(len(self.mix_slots)))
+        random.shuffle(self.mix_absent)
+        self.mix_present = []
+        buf = b'a' * self.blocksize
+        for i in range(len(self.mix_slots) // 2):
+            slot = self.mix_absent.pop()
+            sfd, filename = self.mix_slots[slot]
+            fd = os.open(filename, os.O_WRONLY | os.O_CREAT, dir_fd=sfd)
+            for block in range(self.block_count):
+                os.write(fd, buf)
+            os.close(fd)
+            self.mix_present.append(slot)
+
+    def mixed_teardown(self, pid: int):
+        for slot in self.mix_present:
+            sfd, filename = self.mix_slots[slot]
+            os.unlink(filename, dir_fd=sfd)
+        for dfd, dirname, sfd in self.mix_sfds:
+            os.close(sfd)
+            os.rmdir(dirname, dir_fd=dfd)
+        for direc, dfd in self.mix_dfds:
+            os.close(dfd)
+            self.remdir(direc)
+        for bdir in self.dir_list:
+            self.remdir(f"{bdir}/p{pid}")
+
+    def mixthem(self, pid: int, latency: dict):
+        """
+        Run a random mix of create, read, stat, and remove operations for a
+        fixed duration over the working set established by mixed_setup.
+        Creates fall back to removes when the working set is full, and
+        other operations fall back to creates when it is empty.
+        :return: operation count, and per-operation counts and timeseries
+        """
+        buf = mmap.mmap(-1, max(self.blocksize, 1))
+        buf.write(b'a' * self.blocksize)
+        bufs = [buf]
+        clock = time.perf_counter_ns
+        rand = random.random
+        randrange = random.randrange
+        create_flags = self.flags | os.O_WRONLY | os.O_CREAT
+        read_flags = self.flags | os.O_RDONLY
+        blocksize = self.blocksize
+        block_count = self.block_count
+        slots = self.mix_slots
+        present = self.mix_present
+        absent = self.mix_absent
+        cumulative = []
+        total_weight = 0
+        for op in self.mix_ops:
+            total_weight += self.mix[op]
+            cumulative.append((total_weight, op))
+        for op in self.mix_ops:
+            latency[op] = cb_histogram()
+        counts = dict.fromkeys(self.mix_ops, 0)
+        interval_counts = dict.fromkeys(self.mix_ops, 0)
+        timeseries = []
+        interval_ns = int(self.mixed_interval * 1000000000)
+        run_start = clock()
+        interval_start = run_start
+        next_interval = run_start + interval_ns
+        deadline = run_start + int(self.mixed_duration * 1000000000)
+        while True:
+            now = clock()
+            if now >= next_interval or now >= deadline:
+                interval = {'start': (interval_start - run_start) / 1000000000.0,
+                            'elapsed': (now - interval_start) / 1000000000.0}
+                interval.update(interval_counts)
+                timeseries.append(interval)
+                interval_counts = dict.fromkeys(self.mix_ops, 0)
+                interval_start = now
+                next_interval += interval_ns
+                if now >= deadline:
+                    break
+            choice = rand() * total_weight
+            for weight, op in cumulative:
+                if choice < weight:
+                    break
+            if op == 'create':
+                if not absent:
+                    op = 'remove'
+            elif not present:
+                op = 'create'
+            if op == 'create':
+                idx = randrange(len(absent))
+                slot = absent[idx]
+                absent[idx] = absent[-1]
+                absent.pop()
+                sfd, filename = slots[slot]
+                start = clock()
+                fd = os.open(filename, create_flags, dir_fd=sfd)
+                for block in range(block_count):
+                    os.write(fd, buf)
+                os.close(fd)
+                latency['create'].record_ns(clock() - start)
+                present.append(slot)
+            elif op == 'remove':
+                idx = randrange(len(present))
+                slot = present[idx]
+                present[idx] = present[-1]
+                present.pop()
+                sfd, filename = slots[slot]
+                start = clock()
+                os.unlink(filename, dir_fd=sfd)
+                latency['remove'].record_ns(clock() - start)
+                absent.append(slot)
+            else:
+                sfd, filename = slots[present[randrange(len(present))]]
+                if op == 'read':
+                    start = clock()
+                    fd = os.open(filename, read_flags, dir_fd=sfd)
+                    try:
+                        for block in range(block_count):
+                            answer = os.readv(fd, bufs)
+                            if answer != blocksize:
+                                raise IOError(f"Incomplete read from {filename}: {answer} bytes, expect {blocksize}")
+                    finally:
+                        os.close(fd)
+                    latency['read'].record_ns(clock() - start)
+                else:
+                    start = clock()
+                    os.stat(filename, dir_fd=sfd)
+                    latency['stat'].record_ns(clock() - start)
+            counts[op] += 1
+            interval_counts[op] += 1
+        return sum(counts.values()), {'op_counts': counts, 'timeseries': timeseries}
+
     def run_one_operation(self, op_name0: str, op_name1: str, op_name2: str, op_func, pid: int, data_start_time: float):
         self._sync_to_controller(self._idname([pid, f"start {op_name2}"]))
         self._drop_cache()
         ucpu, scpu = self._cputimes()
         op_start_time = self._adjusted_time() - data_start_time
-        ops = op_func(pid)
+        latency = {}
+        ops = op_func(pid, latency)
+        op_extras = {}
+        if isinstance(ops, tuple):
+            ops, op_extras = ops
         op_end_time_0 = self._adjusted_time() - data_start_time
         self._drop_cache()
         op_end_time = self._adjusted_time() - data_start_time
@@ -146,8 +496,10 @@ class files_client(clusterbuster_pod_client):
             'operation_start': op_start_time,
             'operation_end': op_end_time,
             'operations': ops,
-            'operations_per_second': ops / op_elapsed_time
+            'operations_per_second': ops / op_elapsed_time,
+            'latency': {name: histogram.as_dict() for name, histogram in latency.items()}
             }
+        answer.update(op_extras)
         if op_name2 == 'read':
             answer['total_files'] = self.files_per_dir * self.dirs * len(self.dir_list)
             answer['self.block_count'] = self.block_count
@@ -158,20 +510,61 @@ class files_client(clusterbuster_pod_client):
         self._sync_to_controller(self._idname([pid, f'end {op_name2}']))
         return answer
 
+    def phase_pause(self):
+        if self.phase_sleep > 0:
+            self._timestamp(f"Sleeping for {self.phase_sleep} seconds")
+            time.sleep(self.phase_sleep)
+            self._timestamp('Back from sleep')
+
+    def summary(self):
+        return {
+            'volumes': len(self.dir_list),
+            'dirs_per_volume': self.dirs,
+            'total_dirs': self.dirs * len(self.dir_list),
+            'self.files_per_dir': self.files_per_dir,
+            'total_files': self.files_per_dir * self.dirs * len(self.dir_list),
+            'self.blocksize': self.blocksize,
+            'blocks_per_file': self.block_count,
+            'filesize': self.blocksize * self.block_count,
+            'data_size': self.blocksize * self.block_count * self.files_per_dir * self.dirs * len(self.dir_list),
+            # The mixed workload always operates relative to directory fds
+            'io_mode': 'dirfd' if self.use_dirfd or self.mixed_duration > 0 else 'path'
+            }
+
+    def runit_mixed(self, process: int):
+        data_start_time = self._adjusted_time()
+        self.mixed_setup(os.getpid())
+        subprocess.run('sync')
+        answer_mixed = self.run_one_operation('Running', 'Ran', 'mixed', self.mixthem, os.getpid(), data_start_time)
+        self.mixed_teardown(os.getpid())
+        answer_mixed['duration'] = self.mixed_duration
+        answer_mixed['interval'] = self.mixed_interval
+        answer_mixed['mix'] = self.mix
+        extras = {
+            'summary': self.summary(),
+            'mixed': answer_mixed
+            }
+        self._report_results(answer_mixed['operation_start'], answer_mixed['operation_end'],
+                             answer_mixed['operation_elapsed_time'], answer_mixed['user_cpu_time'],
+                             answer_mixed['system_cpu_time'], extras)
+
     def runit(self, process: int):
-        self.removethem(os.getpid(), True)
+        self.removethem(os.getpid(), {}, True)
+        if self.mixed_duration > 0:
+            return self.runit_mixed(process)
         data_start_time = self._adjusted_time()
 
+        if self.use_dirfd:
+            makethem, readthem, removethem = self.makethem_dirfd, self.readthem_dirfd, self.removethem_dirfd
+        else:
+            makethem, readthem, removethem = self.makethem, self.readthem, self.removethem
+
         subprocess.run('sync')
-        answer_create = self.run_one_operation('Creating', 'Created', 'create', self.makethem, os.getpid(), data_start_time)
-        self._timestamp("Sleeping for 60 seconds")
-        time.sleep(60)
-        self._timestamp('Back from sleep')
-        answer_read = self.run_one_operation('Reading', 'Read', 'read', self.readthem, os.getpid(), data_start_time)
-        self._timestamp("Sleeping for 60 seconds")
-        time.sleep(60)
-        self._timestamp('Back from sleep')
-        answer_remove = self.run_one_operation('Removing', 'Remove', 'remove', self.removethem, os.getpid(), data_start_time)
+        answer_create = self.run_one_operation('Creating', 'Created', 'create', makethem, os.getpid(), data_start_time)
+        self.phase_pause()
+        answer_read = self.run_one_operation('Reading', 'Read', 'read', readthem, os.getpid(), data_start_time)
+        self.phase_pause()
+        answer_remove = self.run_one_operation('Removing', 'Remove', 'remove', removethem, os.getpid(), data_start_time)
         create_et = answer_create['operation_end'] - answer_create['operation_start']
         # read_et = answer_read['operation_end'] - answer_read['operation_start']
         remove_et = answer_remove['operation_end'] - answer_remove['operation_start']
@@ -180,17 +573,7 @@ class files_client(clusterbuster_pod_client):
         user_cpu = answer_create['user_cpu_time'] + answer_remove['user_cpu_time']
         system_cpu = answer_create['system_cpu_time'] + answer_remove['system_cpu_time']
         extras = {
-            'summary': {
-                'volumes': len(self.dir_list),
-                'dirs_per_volume': self.dirs,
-                'total_dirs': self.dirs * len(self.dir_list),
-                'self.files_per_dir': self.files_per_dir,
-                'total_files': self.files_per_dir * self.dirs * len(self.dir_list),
-                'self.blocksize': self.blocksize,
-                'blocks_per_file': self.block_count,
-                'filesize': self.blocksize * self.block_count,
-                'data_size': self.blocksize * self.block_count * self.files_per_dir * self.dirs * len(self.dir_list)
-                },
+            'summary': self.summary(),
             'create': answer_create,
             'read': answer_read,
             'remove': answer_remove
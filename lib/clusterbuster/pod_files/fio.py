@@ -5,8 +5,10 @@ import subprocess
 import re
 import json
 import shutil
+import threading
 
 from clusterbuster_pod_client import clusterbuster_pod_client
+from cb_histogram import cb_histogram
 
 
 class fio_client(clusterbuster_pod_client):
@@ -35,34 +37,360 @@ class fio_client(clusterbuster_pod_client):
                 self.fio_generic_args = re.split(r'\s+', self._args[11])
             else:
                 self.fio_generic_args = []
+            self.prep_method = self._args[12]
+            if self.prep_method not in ['pwrite', 'fallocate', 'dd']:
+                raise ValueError(f"Unknown file preparation method {self.prep_method}")
+            self.prep_threads = max(int(self._args[13]), 1)
+            self.single_process = self._toBool(self._args[14])
+            self.raw_output = self._toBool(self._args[15])
+            self.status_interval = int(self._args[16])
+            self.filename_re = re.compile(r'\s*filename\s*=\s*(.+)')
+            self.filesize_re = re.compile(r'\s*size\s*=\s*([0-9]+)')
+            self.prepared_files = {}
+            self.file_preparation = {
+                'method': self.prep_method,
+                'elapsed_time': 0,
+                'files_prepared': 0,
+                'files_reused': 0,
+                'bytes_written': 0
+                }
         except Exception as err:
             self._abort(f"Init failed! {err} {' '.join(self._args)}")
 
-    def get_token(self, pattern: str, string: str, token: int = 1):
-        match = re.match(pattern, string)
-        if match:
-            return match.group(token)
-        else:
-            return None
+    def prepare_file_dd(self, filename: str, filesize: int):
+        blocksize = 2 ** 20
+        blocks = int((filesize + blocksize - 1) / blocksize)
+        subprocess.run(['dd', 'if=/dev/zero', f'of={filename}', f'bs={str(blocksize)}', f'count={str(blocks)}'])
+        subprocess.run(['sync'])
+        return blocks * blocksize
+
+    def prepare_file_fallocate(self, filename: str, filesize: int):
+        fd = os.open(filename, os.O_WRONLY | os.O_CREAT, 0o644)
+        try:
+            os.posix_fallocate(fd, 0, filesize)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        return 0
+
+    def prepare_file_pwrite(self, filename: str, filesize: int):
+        """
+        Fill the file with incompressible data, using self.prep_threads
+        threads each writing a contiguous range.  Every block is freshly
+        generated, so that the file can be neither deduplicated nor
+        compressed; os.urandom releases the GIL, so the threads generate
+        data in parallel.
+        """
+        blocksize = 2 ** 20
+        blocks = int((filesize + blocksize - 1) / blocksize)
+        blocks_per_thread = int((blocks + self.prep_threads - 1) / self.prep_threads)
+        errors = []
+        fd = os.open(filename, os.O_WRONLY | os.O_CREAT, 0o644)
+
+        def write_range(first: int, last: int):
+            try:
+                for block in range(first, last):
+                    view = memoryview(os.urandom(blocksize))
+                    offset = block * blocksize
+                    length = min(blocksize, filesize - offset)
+                    written = 0
+                    while written < length:
+                        written += os.pwrite(fd, view[written:length], offset + written)
+            except Exception as exc:
+                errors.append(exc)
+
+        try:
+            os.ftruncate(fd, filesize)
+            threads = [threading.Thread(target=write_range,
+                                        args=(first, min(first + blocks_per_thread, blocks)))
+                       for first in range(0, blocks, blocks_per_thread)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            if errors:
+                raise errors[0]
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        return filesize
 
     def prepare_data_file(self, jobfile: str):
+        filename = None
+        filesize = None
         with open(jobfile) as job:
-            lines = [line.strip() for line in job.readlines()]
-            for line in lines:
-                if self.get_token(r'filename\s*=\s*(.+)', line):
-                    filename = self.get_token(r'\s*filename\s*=\s*(.+)', line)
-                elif self.get_token(r'size\s*=\s*([0-9]+)', line):
-                    filesize = int(self.get_token(r'size\s*=\s*([0-9]+)', line))
+            for line in job:
+                match = self.filename_re.match(line)
+                if match:
+                    filename = match.group(1).strip()
+                    continue
+                match = self.filesize_re.match(line)
+                if match:
+                    filesize = int(match.group(1))
+        if filename is None or filesize is None:
+            raise ValueError(f"Job file {jobfile} must specify filename and size")
         self._timestamp(f"  Job file {filename} will be size {filesize}")
-        blocksize = 2 ** 20
-        blocks = int((filesize + blocksize - 1) / blocksize)
+        prep_start = self._adjusted_time()
+        # The file may have been removed since it was prepared (e. g. by a
+        # job file that specifies unlink=1), in which case prepare it again.
+        if (self.prepared_files.get(filename) == filesize and
+                os.path.exists(filename) and os.path.getsize(filename) >= filesize):
+            self._timestamp(f"Reusing {filename} from previous job file")
+            self.file_preparation['files_reused'] += 1
+            return
         dirname = os.path.dirname(filename)
         if not self._isdir(dirname):
             os.makedirs(dirname)
-        self._timestamp("Starting file creation")
-        subprocess.run(['dd', 'if=/dev/zero', f'of={filename}', f'bs={str(blocksize)}', f'count={str(blocks)}'])
-        subprocess.run(['sync'])
-        self._timestamp("File created")
+        self._timestamp(f"Starting file creation using {self.prep_method}")
+        if self.prep_method == 'fallocate':
+            written = self.prepare_file_fallocate(filename, filesize)
+        elif self.prep_method == 'pwrite':
+            written = self.prepare_file_pwrite(filename, filesize)
+        else:
+            written = self.prepare_file_dd(filename, filesize)
+        self.prepared_files[filename] = filesize
+        prep_time = self._adjusted_time(prep_start)
+        self.file_preparation['elapsed_time'] += prep_time
+        self.file_preparation['files_prepared'] += 1
+        self.file_preparation['bytes_written'] += written
+        self._timestamp(f"File created in {prep_time:.3f} seconds")
+
+    def reduce_results(self, result: dict):
+        """
+        Shrink fio json+ output before it is reported.  Per-bucket latency
+        bins are replaced by a compact cb_histogram (fio's own percentiles
+        are retained), and per-job sections that are not reported are dropped.
+        :param result: Parsed fio output; modified in place
+        :return: result
+        """
+        if self.raw_output:
+            return result
+        for job in result.get('jobs', []):
+            for key in ['iodepth_submit', 'iodepth_complete', 'latency_ns', 'latency_us', 'latency_ms',
+                        'latency_depth', 'latency_target', 'latency_percentile', 'latency_window']:
+                job.pop(key, None)
+            for op in ['read', 'write', 'trim', 'sync']:
+                if op not in job:
+                    continue
+                for lat in ['slat_ns', 'clat_ns', 'lat_ns']:
+                    stats = job[op].get(lat)
+                    if isinstance(stats, dict) and 'bins' in stats:
+                        histogram = cb_histogram()
+                        for value, count in stats.pop('bins').items():
+                            histogram.record_ns(int(value), count)
+                        stats['histogram'] = histogram.as_dict()
+        return result
+
+    def update_timeseries(self, status: dict, timeseries: dict, last_counters: dict, job_keys: dict, default_key: str):
+        """
+        Add one interval from fio periodic status output to the timeseries.
+        fio reports cumulative counters, so each interval is the difference
+        from the previous status.  Jobs that did not run during the interval
+        (not yet started, ramping, or finished) contribute nothing.
+        :param status: Parsed fio status output
+        :param timeseries: Timeseries, by key, to update
+        :param last_counters: Counters from the previous status, by job index
+        :param job_keys: Map from fio job names to timeseries keys
+        :param default_key: Key for jobs not in job_keys
+        """
+        intervals = {}
+        for idx, job in enumerate(status.get('jobs', [])):
+            key = job_keys.get(job['jobname'], default_key) if job_keys else default_key
+            if key is None:
+                continue
+            ops = [job[op] for op in ['read', 'write', 'trim'] if op in job]
+            runtime = job.get('job_runtime', max([op.get('runtime', 0) for op in ops], default=0))
+            counters = [runtime,
+                        sum([op['total_ios'] for op in ops]),
+                        sum([op['io_kbytes'] * 1024 for op in ops]),
+                        sum([op['lat_ns']['mean'] * op['total_ios'] for op in ops if 'lat_ns' in op])]
+            last = last_counters.get(idx, [0, 0, 0, 0])
+            if counters[0] < last[0] or counters[1] < last[1]:
+                # fio resets its statistics at the end of ramp time
+                last = [0, 0, 0, 0]
+            last_counters[idx] = counters
+            delta = [counter - prev for counter, prev in zip(counters, last)]
+            if delta[0] <= 0:
+                continue
+            if key not in intervals:
+                intervals[key] = [0, 0, 0, 0]
+            interval = intervals[key]
+            interval[0] = max(interval[0], delta[0])
+            for i in range(1, 4):
+                interval[i] += delta[i]
+        for key, (runtime, ios, nbytes, latency) in intervals.items():
+            if key not in timeseries:
+                timeseries[key] = []
+            series = timeseries[key]
+            start = series[-1]['start'] + series[-1]['elapsed'] if series else 0
+            elapsed = runtime / 1000.0
+            series.append({
+                'start': start,
+                'elapsed': elapsed,
+                'total_ios': ios,
+                'io_bytes': nbytes,
+                'io_rate': ios / elapsed,
+                'data_rate': nbytes / elapsed,
+                'lat_mean': latency / ios / 1000000000.0 if ios > 0 else 0
+                })
+
+    def run_fio(self, command: list, job_keys: dict = None, default_key: str = None):
+        """
+        Run fio, reading its output incrementally.  If a status interval
+        is set, fio writes a complete JSON document at each interval;
+        these are reduced to per-interval timeseries as they arrive.
+        :param command: fio command, without output options
+        :param job_keys: Map from fio job names to timeseries keys
+        :param default_key: Key for jobs not in job_keys
+        :return: (final fio output, timeseries by key)
+        """
+        command = command + ['--output-format=json+']
+        if self.status_interval > 0:
+            command.append(f'--status-interval={self.status_interval}')
+        timeseries = {}
+        last_counters = {}
+        result = None
+        lines = []
+        with subprocess.Popen(command, stdout=subprocess.PIPE, text=True) as run:
+            for line in run.stdout:
+                lines.append(line)
+                # Only the closing brace of a top level object is unindented
+                if line.rstrip() == '}':
+                    text = ''.join(lines)
+                    lines = []
+                    result = json.loads(text[text.index('{'):])
+                    if self.status_interval > 0:
+                        self.update_timeseries(result, timeseries, last_counters, job_keys, default_key)
+        if result is None:
+            raise Exception(f"No output from {' '.join(command)}")
+        return self.reduce_results(result), timeseries
+
+    def job_matrix(self):
+        """
+        :return: list of (jobname, job options) for every combination of
+                 blocksize, pattern, iodepth, fdatasync, direct, and ioengine
+        """
+        jobs = []
+        jobidx = 1
+        for size in self.fio_blocksizes:
+            for pattern in self.fio_patterns:
+                for iodepth in self.fio_iodepths:
+                    for fdatasync in self.fio_fdatasyncs:
+                        for direct in self.fio_directs:
+                            for ioengine in self.fio_ioengines:
+                                jobname = '%04d-%s-%d-%d-%d-%d-%s' % (jobidx, pattern, size, iodepth, fdatasync, direct, ioengine)
+                                jobs.append((jobname, {
+                                    'rw': pattern,
+                                    'bs': size,
+                                    'iodepth': iodepth,
+                                    'fdatasync': int(fdatasync),
+                                    'direct': int(direct),
+                                    'ioengine': ioengine
+                                    }))
+                                jobidx = jobidx + 1
+        return jobs
+
+    def make_combined_jobfile(self, jobfile: str, combined_jobfile: str):
+        """
+        Write a job file that runs every combination in the job matrix
+        as stonewalled sections of a single fio run.  Each job section of
+        the original job file is replicated once per combination.
+        :return: dict mapping fio section names to job matrix names
+        """
+        global_lines = []
+        sections = []
+        current = None
+        with open(jobfile) as job:
+            for line in job:
+                line = line.strip()
+                if not line or line.startswith('#') or line.startswith(';'):
+                    continue
+                if line.startswith('[') and line.endswith(']'):
+                    name = line[1:-1].strip()
+                    if name == 'global':
+                        current = global_lines
+                    else:
+                        current = []
+                        sections.append((name, current))
+                elif current is not None:
+                    current.append(line)
+        section_map = {}
+        with open(combined_jobfile, mode='w') as outfile:
+            print('[global]', file=outfile)
+            for line in global_lines:
+                print(line, file=outfile)
+            print(f'runtime={self.runtime}', file=outfile)
+            for jobname, options in self.job_matrix():
+                for idx, (section, lines) in enumerate(sections):
+                    if len(sections) > 1:
+                        section_name = f'{jobname}.{section}'
+                    else:
+                        section_name = jobname
+                    section_map[section_name] = jobname
+                    print(f'\n[{section_name}]', file=outfile)
+                    if idx == 0:
+                        print('stonewall', file=outfile)
+                    for option, value in options.items():
+                        print(f'{option}={value}', file=outfile)
+                    for line in lines:
+                        print(line, file=outfile)
+        return section_map
+
+    def runone_combined(self, jobfile: str):
+        """
+        Run the whole job matrix in one fio process and split the
+        results back out by job.  Caches are dropped and the controller
+        synchronized only once, before the run.
+        """
+        all_results = {}
+        ucpu, scpu = self._cputimes()
+        self._timestamp("Creating workfile")
+        self.prepare_data_file(jobfile)
+        self._timestamp("Created workfile")
+        combined_jobfile = f'{jobfile}.combined'
+        section_map = self.make_combined_jobfile(jobfile, combined_jobfile)
+        self._drop_cache()
+        self._sync_to_controller(self._idname(['combined']))
+        self._timestamp("Running...")
+        data_start_time = self._adjusted_time()
+        command = ['fio']
+        command.extend(self.fio_generic_args)
+        command.append(combined_jobfile)
+        result, timeseries = self.run_fio(command, section_map)
+        elapsed_time = self._adjusted_time(data_start_time)
+        for job in result['jobs']:
+            jobname = section_map.get(job['jobname'])
+            if jobname is None:
+                continue
+            if jobname not in all_results:
+                job_result = {key: val for key, val in result.items() if key != 'jobs'}
+                job_result['jobs'] = []
+                if self.status_interval > 0:
+                    job_result['timeseries'] = timeseries.get(jobname, [])
+                all_results[jobname] = {
+                    'job_elapsed_time': 0,
+                    'job_user_cpu_time': 0,
+                    'job_system_cpu_time': 0,
+                    'job_cpu_time': 0,
+                    'job_results': job_result
+                    }
+            answer = all_results[jobname]
+            answer['job_results']['jobs'].append(job)
+            job_runtime = job.get('job_runtime', 0) / 1000.0
+            jucpu = job.get('usr_cpu', 0) * job_runtime / 100.0
+            jscpu = job.get('sys_cpu', 0) * job_runtime / 100.0
+            answer['job_elapsed_time'] = max(answer['job_elapsed_time'], job.get('elapsed', 0))
+            answer['job_user_cpu_time'] += jucpu
+            answer['job_system_cpu_time'] += jscpu
+            answer['job_cpu_time'] += jucpu + jscpu
+        if '-IGNORE-' not in jobfile:
+            data_end_time = self._adjusted_time()
+            ucpu, scpu = self._cputimes(ucpu, scpu)
+            extras = {
+                'results': all_results,
+                'file_preparation': self.file_preparation
+                }
+            self._report_results(data_start_time, data_end_time, elapsed_time, ucpu, scpu, extras)
 
     def runone(self, jobfile: str):
         elapsed_time = 0
@@ -80,44 +408,40 @@ I/O engines: {self._args[11]}""")
         self._timestamp("Creating workfile")
         self.prepare_data_file(jobfile)
         self._timestamp("Created workfile")
-        for size in self.fio_blocksizes:
-            for pattern in self.fio_patterns:
-                for iodepth in self.fio_iodepths:
-                    for fdatasync in self.fio_fdatasyncs:
-                        for direct in self.fio_directs:
-                            for ioengine in self.fio_ioengines:
-                                jobname = '%04d-%s-%d-%d-%d-%d-%s' % (jobidx, pattern, size, iodepth, fdatasync, direct, ioengine)
-                                self._drop_cache()
-                                self._sync_to_controller(jobname)
-                                if jobidx == 1:
-                                    self._timestamp("Running...")
-                                    data_start_time = self._adjusted_time()
-                                jtime = self._adjusted_time()
-                                jucpu, jscpu = self._cputimes()
-                                command = ["fio", f'--rw={pattern}', f'--runtime={self.runtime}', f'--bs={size}',
-                                           f'--iodepth={iodepth}', f'--fdatasync={int(fdatasync)}', f'--direct={int(direct)}',
-                                           f'--ioengine={ioengine}']
-                                command.extend(self.fio_generic_args)
-                                command.extend(['--output-format=json+', jobfile])
-                                with subprocess.Popen(command, stdout=subprocess.PIPE) as run:
-                                    result = json.loads(run.stdout.read())
-                                jtime = self._adjusted_time(jtime)
-                                jucpu, jscpu = self._cputimes(jucpu, jscpu)
-                                elapsed_time += jtime
-                                job_result = {
-                                    'job_elapsed_time': jtime,
-                                    'job_user_cpu_time': jucpu,
-                                    'job_system_cpu_time': jscpu,
-                                    'job_cpu_time': jucpu + jscpu,
-                                    'job_results': result
-                                    }
-                                all_results[jobname] = job_result
-                                jobidx = jobidx + 1
+        for jobname, options in self.job_matrix():
+            self._drop_cache()
+            self._sync_to_controller(jobname)
+            if jobidx == 1:
+                self._timestamp("Running...")
+                data_start_time = self._adjusted_time()
+            jtime = self._adjusted_time()
+            jucpu, jscpu = self._cputimes()
+            command = ["fio", f'--rw={options["rw"]}', f'--runtime={self.runtime}', f'--bs={options["bs"]}',
+                       f'--iodepth={options["iodepth"]}', f'--fdatasync={options["fdatasync"]}',
+                       f'--direct={options["direct"]}', f'--ioengine={options["ioengine"]}']
+            command.extend(self.fio_generic_args)
+            command.append(jobfile)
+            result, timeseries = self.run_fio(command, default_key=jobname)
+            if self.status_interval > 0:
+                result['timeseries'] = timeseries.get(jobname, [])
+            jtime = self._adjusted_time(jtime)
+            jucpu, jscpu = self._cputimes(jucpu, jscpu)
+            elapsed_time += jtime
+            job_result = {
+                'job_elapsed_time': jtime,
+                'job_user_cpu_time': jucpu,
+                'job_system_cpu_time': jscpu,
+                'job_cpu_time': jucpu + jscpu,
+                'job_results': result
+                }
+            all_results[jobname] = job_result
+            jobidx = jobidx + 1
         if '-IGNORE-' not in jobfile:
             data_end_time = self._adjusted_time()
             ucpu, scpu = self._cputimes(ucpu, scpu)
             extras = {
-                'results': all_results
+                'results': all_results,
+                'file_preparation': self.file_preparation
                 }
             self._report_results(data_start_time, data_end_time, elapsed_time, ucpu, scpu, extras)
 
@@ -154,7 +478,10 @@ I/O engines: {self._args[11]}""")
         if not jobfiles:
             raise Exception("Error: no jobfiles provided!")
         for jobfile in jobfiles:
-            self.runone(jobfile)
+            if self.single_process:
+                self.runone_combined(jobfile)
+            else:
+                self.runone(jobfile)
         shutil.rmtree(self.rundir, ignore_errors=True)
 
 
@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 
+import os
 import sys
 import time
 from clusterbuster_pod_client import clusterbuster_pod_client
@@ -19,10 +20,106 @@ class logger_client(clusterbuster_pod_client):
             self.__lines_per_io = self._toSize(self._args[3])
             self.__xfer_count = self._toSize(self._args[4])
             self.__delay = float(self._args[5])
+            self.__mode = self._args[6]
+            if self.__mode not in ['classic', 'direct']:
+                raise ValueError(f"Unknown log mode {self.__mode}")
+            self.__line_rate = float(self._args[7])
+            self.__use_writev = self._toBool(self._args[8])
         except Exception as err:
             self._abort(f"Init failed! {err} {' '.join(self._args)}")
 
+    def __write_all(self, fd: int, buf):
+        """
+        Write the whole buffer, handling short writes
+        :return: Number of write calls
+        """
+        view = memoryview(buf)
+        calls = 0
+        while len(view) > 0:
+            view = view[os.write(fd, view):]
+            calls += 1
+        return calls
+
+    def __writev_all(self, fd: int, lines: list):
+        """
+        Write a list of lines with writev, IOV_MAX lines at a time,
+        handling short writes
+        :return: Number of write calls
+        """
+        calls = 0
+        iov_max = os.sysconf('SC_IOV_MAX')
+        for start in range(0, len(lines), iov_max):
+            chunk = lines[start:start + iov_max]
+            expected = sum(len(line) for line in chunk)
+            written = os.writev(fd, chunk)
+            calls += 1
+            if written < expected:
+                calls += self.__write_all(fd, memoryview(b''.join(chunk))[written:])
+        return calls
+
+    def run_direct(self):
+        """
+        Write preformatted, sequence-numbered lines directly to stderr
+        in batches of lines_per_io lines, optionally paced to a target
+        line rate.  Each line reads
+            CBLOG <stream id> <sequence> AAAA...
+        and the stream ends with
+            CBLOG <stream id> END <lines written>
+        so that retrieved logs can be checked for missing lines with
+        check-clusterbuster-logs.
+        """
+        fd = sys.stderr.fileno()
+        stream_id = self._idname()
+        prefix = f'CBLOG {stream_id} '.encode()
+        # Lines are padded to bytes_per_line, but never truncated
+        pad = max(self.__bytes_per_line - (len(prefix) + 13), 0)
+        line_fmt = prefix.replace(b'%', b'%%') + b'%012d' + (b' ' + b'A' * (pad - 1) if pad > 0 else b'') + b'\n'
+        batch_lines = max(self.__lines_per_io, 1)
+        batch_fmt = line_fmt * batch_lines
+        user, system = self._cputimes()
+        data_start_time = self._adjusted_time()
+        next_batch_time = data_start_time
+        xfers = 0
+        seq = 0
+        write_calls = 0
+        bytes_transferred = 0
+        while ((self.__xfer_time == 0 and self.__xfer_count == 0) or
+               (self.__xfer_time > 0 and self._adjusted_time(data_start_time) < self.__xfer_time) or
+               (self.__xfer_count > 0 and xfers < self.__xfer_count)):
+            if self.__use_writev:
+                lines = [line_fmt % line_seq for line_seq in range(seq + 1, seq + batch_lines + 1)]
+                write_calls += self.__writev_all(fd, lines)
+                bytes_transferred += sum(len(line) for line in lines)
+            else:
+                batch = batch_fmt % tuple(range(seq + 1, seq + batch_lines + 1))
+                write_calls += self.__write_all(fd, batch)
+                bytes_transferred += len(batch)
+            seq += batch_lines
+            xfers += 1
+            if self.__line_rate > 0:
+                next_batch_time += batch_lines / self.__line_rate
+                delay = next_batch_time - self._adjusted_time()
+                if delay > 0:
+                    time.sleep(delay)
+            elif self.__delay > 0:
+                time.sleep(self.__delay)
+        data_end_time = self._adjusted_time()
+        self.__write_all(fd, f'CBLOG {stream_id} END {seq}\n'.encode())
+        user, system = self._cputimes(user, system)
+        elapsed_time = data_end_time - data_start_time
+        extras = {
+            'log_stream_id': stream_id,
+            'lines_written': seq,
+            'write_calls': write_calls,
+            'bytes_transferred': bytes_transferred,
+            'target_line_rate': self.__line_rate,
+            'line_rate': seq / elapsed_time if elapsed_time > 0 else 0
+            }
+        self._report_results(data_start_time, data_end_time, elapsed_time, user, system, extras)
+
     def runit(self, process: int):
+        if self.__mode == 'direct':
+            return self.run_direct()
         xferbuf = f"{'A' * (self.__bytes_per_line - 1)}\n" * self.__lines_per_io
         user, system = self._cputimes()
         data_start_time = self._adjusted_time()
@@ -1,9 +1,48 @@
 #!/usr/bin/env python3
 
 import os
+import time
+import socket
+import struct
+import selectors
+import multiprocessing
+from resource import getrusage, RUSAGE_SELF
 
 from clusterbuster_pod_client import clusterbuster_pod_client
 
+# UDP control sequence numbers; these must match client.py
+UDP_PROBE = 2 ** 64 - 2
+UDP_FIN = 2 ** 64 - 1
+# How long past the end of the run, or with nothing received once data
+# has started, the UDP server waits for clients' FINs, which may be lost
+UDP_FIN_GRACE = 30
+
+
+class server_connection:
+    """
+    Per-connection state for the event driven server
+    """
+
+    def __init__(self, conn, address, start_time: float):
+        self.conn = conn
+        self.peer = f'{address[0]}:{address[1]}'
+        self.start_time = start_time
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self.partial = 0
+        self.pending = 0
+        self.offset = 0
+        self.writing = False
+
+    def result(self, end_time: float, msg_size: int):
+        return {
+            'peer': self.peer,
+            'bytes_received': self.bytes_received,
+            'bytes_sent': self.bytes_sent,
+            'messages': int(self.bytes_sent / msg_size),
+            'elapsed_time': end_time - self.start_time
+            }
+
 
 class server_client(clusterbuster_pod_client):
     """
@@ -16,7 +55,21 @@ class server_client(clusterbuster_pod_client):
             self.listen_port = int(self._args[0])
             self.msg_size = self._toSize(self._args[1])
             self.expected_clients = int(self._args[2])
+            self.server_mode = self._args[3]
+            if self.server_mode not in ['fork', 'epoll']:
+                raise ValueError(f"Unknown server mode {self.server_mode}")
+            self.server_workers = max(int(self._args[4]), 1)
+            self.protocol = self._args[5]
+            if self.protocol not in ['tcp', 'udp']:
+                raise ValueError(f"Unknown protocol {self.protocol}")
+            self.run_time = float(self._args[6])
+            self.udp_timeout = float(self._args[7])
             self.buf = b'B' * self.msg_size
+            if self.server_mode == 'epoll' or self.protocol == 'udp':
+                self._set_processes(self.server_workers)
+                # Shared across the worker processes so that each knows
+                # when all clients, wherever they connected, are done
+                self.closed_connections = multiprocessing.Value('i', 0)
         except Exception as err:
             self._abort(f"Init failed! {err} {' '.join(self._args)}")
 
@@ -38,7 +91,206 @@ class server_client(clusterbuster_pod_client):
                 answer = conn.send(self.buf[(self.msg_size - ntotal):])
                 ntotal -= answer
 
+    def send_pending(self, sel, state: server_connection, sendbuf: memoryview):
+        """
+        Send as much of the pending reply data as the socket will accept,
+        and wait for writability only while data remains.
+        :return: False if the connection failed
+        """
+        try:
+            while state.pending > 0:
+                nbytes = state.conn.send(sendbuf[state.offset:min(self.msg_size, state.offset + state.pending)])
+                state.bytes_sent += nbytes
+                state.pending -= nbytes
+                state.offset = (state.offset + nbytes) % self.msg_size
+        except BlockingIOError:
+            pass
+        except OSError:
+            return False
+        if state.pending > 0 and not state.writing:
+            sel.modify(state.conn, selectors.EVENT_READ | selectors.EVENT_WRITE, state)
+            state.writing = True
+        elif state.pending == 0 and state.writing:
+            sel.modify(state.conn, selectors.EVENT_READ, state)
+            state.writing = False
+        return True
+
+    def server_results(self, connections: list, user: float, system: float, busy_time: float, idle_time: float,
+                       start_usage, end_usage):
+        return {
+            'server': {
+                'mode': 'udp' if self.protocol == 'udp' else self.server_mode,
+                'workers': self.server_workers,
+                'connections': connections,
+                'bytes_received': sum([conn['bytes_received'] for conn in connections]),
+                'bytes_sent': sum([conn['bytes_sent'] for conn in connections]),
+                'cpu': {
+                    'user_cpu_time': user,
+                    'system_cpu_time': system,
+                    'busy_time': busy_time,
+                    'idle_time': idle_time,
+                    'voluntary_context_switches': end_usage.ru_nvcsw - start_usage.ru_nvcsw,
+                    'involuntary_context_switches': end_usage.ru_nivcsw - start_usage.ru_nivcsw
+                    }
+                }
+            }
+
+    def run_udp_server(self):
+        """
+        Echo every datagram back to its sender.  Each client announces
+        the end of its run with a FIN datagram; probes sent before the
+        run starts are echoed but not counted.  Since FINs can be lost,
+        stop waiting for them UDP_FIN_GRACE seconds after the longest
+        run should have ended, or, if the run is not timed, once nothing
+        has been received for that long.
+        """
+        sock = self._get_port(self.listen_port, reuse_port=self.server_workers > 1, sock_type=socket.SOCK_DGRAM)
+        sock.settimeout(1)
+        recvbuf = bytearray(65536)
+        recvview = memoryview(recvbuf)
+        peers = {}
+        finished = set()
+        data_start_time = None
+        data_end_time = None
+        busy_time = 0
+        idle_time = 0
+        self._sync_to_controller()
+        user, system = self._cputimes()
+        start_usage = getrusage(RUSAGE_SELF)
+        if self.run_time > 0:
+            deadline = time.time() + self.run_time + self.udp_timeout + UDP_FIN_GRACE
+        else:
+            deadline = time.time() + UDP_FIN_GRACE
+        while self.closed_connections.value < self.expected_clients:
+            wait_start = time.time()
+            if wait_start > deadline:
+                self._timestamp(f"Timed out with {self.expected_clients - self.closed_connections.value} FIN(s) missing")
+                break
+            try:
+                nbytes, address = sock.recvfrom_into(recvbuf)
+            except socket.timeout:
+                idle_time += time.time() - wait_start
+                continue
+            wait_end = time.time()
+            if self.run_time <= 0:
+                deadline = wait_end + UDP_FIN_GRACE
+            idle_time += wait_end - wait_start
+            seq = struct.unpack_from('!Q', recvbuf)[0] if nbytes >= 8 else 0
+            sock.sendto(recvview[:nbytes], address)
+            if seq == UDP_FIN:
+                if address not in finished:
+                    finished.add(address)
+                    data_end_time = self._adjusted_time()
+                    with self.closed_connections.get_lock():
+                        self.closed_connections.value += 1
+            elif seq != UDP_PROBE:
+                state = peers.get(address)
+                if state is None:
+                    if data_start_time is None:
+                        data_start_time = self._adjusted_time()
+                    self._timestamp(f"First datagram from {address}")
+                    state = server_connection(None, address, self._adjusted_time())
+                    peers[address] = state
+                state.bytes_received += nbytes
+                state.bytes_sent += nbytes
+            busy_time += time.time() - wait_end
+        sock.close()
+        end_usage = getrusage(RUSAGE_SELF)
+        user, system = self._cputimes(user, system)
+        if data_start_time is None:
+            data_start_time = self._adjusted_time()
+            data_end_time = data_start_time
+        elif data_end_time is None:
+            data_end_time = self._adjusted_time()
+        connections = [state.result(data_end_time, self.msg_size) for state in peers.values()]
+        extras = self.server_results(connections, user, system, busy_time, idle_time, start_usage, end_usage)
+        self._report_results(data_start_time, data_end_time, data_end_time - data_start_time, user, system, extras)
+
+    def run_epoll_server(self):
+        """
+        Serve all connections that arrive at this worker from a single
+        selector loop with non-blocking sockets.
+        """
+        sock = self._listen(port=self.listen_port, backlog=self.expected_clients,
+                            reuse_port=self.server_workers > 1)
+        sock.setblocking(False)
+        sel = selectors.DefaultSelector()
+        sel.register(sock, selectors.EVENT_READ, None)
+        recvbuf = bytearray(max(self.msg_size, 65536))
+        sendbuf = memoryview(self.buf)
+        connections = []
+        data_start_time = None
+        data_end_time = None
+        busy_time = 0
+        idle_time = 0
+        self._sync_to_controller()
+        user, system = self._cputimes()
+        start_usage = getrusage(RUSAGE_SELF)
+        while self.closed_connections.value < self.expected_clients:
+            wait_start = time.time()
+            events = sel.select(timeout=1)
+            wait_end = time.time()
+            idle_time += wait_end - wait_start
+            for key, mask in events:
+                state = key.data
+                if state is None:
+                    while True:
+                        try:
+                            conn, address = sock.accept()
+                        except BlockingIOError:
+                            break
+                        conn.setblocking(False)
+                        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                        if data_start_time is None:
+                            data_start_time = self._adjusted_time()
+                        self._timestamp(f"Accepted connection from {address}")
+                        state = server_connection(conn, address, self._adjusted_time())
+                        sel.register(conn, selectors.EVENT_READ, state)
+                    continue
+                ok = True
+                if mask & selectors.EVENT_READ:
+                    try:
+                        nbytes = state.conn.recv_into(recvbuf)
+                    except BlockingIOError:
+                        nbytes = None
+                    except OSError:
+                        nbytes = 0
+                    if nbytes == 0:
+                        ok = False
+                    elif nbytes:
+                        state.bytes_received += nbytes
+                        state.partial += nbytes
+                        state.pending += self.msg_size * int(state.partial / self.msg_size)
+                        state.partial %= self.msg_size
+                if ok and state.pending > 0:
+                    ok = self.send_pending(sel, state, sendbuf)
+                if not ok:
+                    sel.unregister(state.conn)
+                    state.conn.close()
+                    data_end_time = self._adjusted_time()
+                    connections.append(state.result(data_end_time, self.msg_size))
+                    with self.closed_connections.get_lock():
+                        self.closed_connections.value += 1
+            busy_time += time.time() - wait_end
+        sel.close()
+        sock.close()
+        end_usage = getrusage(RUSAGE_SELF)
+        user, system = self._cputimes(user, system)
+        if data_start_time is None:
+            data_start_time = self._adjusted_time()
+            data_end_time = data_start_time
+        extras = self.server_results(connections, user, system, busy_time, idle_time, start_usage, end_usage)
+        self._report_results(data_start_time, data_end_time, data_end_time - data_start_time, user, system, extras)
+
     def runit(self, process: int):
+        if self.protocol == 'udp':
+            return self.run_udp_server()
+        if self.server_mode == 'epoll':
+            return self.run_epoll_server()
+        # The forking server does not report results and is not counted
+        # among the sync clients, so it must not take a result slot once
+        # its clients disconnect.
+        self._enable_sync(False)
         expected_clients = self.expected_clients
         sock = self._listen(port=self.listen_port, backlog=self.expected_clients)
 
@@ -1,7 +1,9 @@
 #!/usr/bin/env python3
 
 import time
+from array import array
 from clusterbuster_pod_client import clusterbuster_pod_client
+from cb_histogram import cb_histogram
 
 
 class synctest_client(clusterbuster_pod_client):
@@ -19,17 +21,47 @@ class synctest_client(clusterbuster_pod_client):
         except Exception as err:
             self._abort(f"Init failed! {err} {' '.join(self._args)}")
 
+    def make_timeseries(self, iteration_start: array, latencies: array):
+        """
+        :return: Start time, elapsed barrier time, and maximum barrier
+                 round trip time of each iteration
+        """
+        timeseries = {'start': iteration_start.tolist(), 'elapsed': [], 'max_latency_sec': []}
+        for i in range(self.sync_count):
+            iteration = latencies[i * self.sync_cluster_count:(i + 1) * self.sync_cluster_count]
+            timeseries['elapsed'].append(sum(iteration))
+            timeseries['max_latency_sec'].append(max(iteration) if iteration else 0)
+        return timeseries
+
     def runit(self, process: int):
+        latencies = array('d')
+        iteration_start = array('d')
         user, system = self._cputimes()
         data_start_time = self._adjusted_time()
         for i in range(self.sync_count):
+            iteration_start.append(self._adjusted_time() - data_start_time)
             for j in range(self.sync_cluster_count):
+                barrier_start = time.perf_counter()
                 self._sync_to_controller(self._idname([i, j]))
+                latencies.append(time.perf_counter() - barrier_start)
             if self.sync_sleep > 0:
                 time.sleep(self.sync_sleep)
         user, system = self._cputimes(user, system)
         data_end_time = self._adjusted_time()
-        self._report_results(data_start_time, data_end_time, data_end_time - data_start_time, user, system)
+        elapsed_time = data_end_time - data_start_time
+        latency = cb_histogram()
+        for value in latencies:
+            latency.record(value)
+        extras = {
+            'barriers': {
+                'count': len(latencies),
+                'barrier_time': sum(latencies),
+                'rate': len(latencies) / elapsed_time if elapsed_time > 0 else 0,
+                'latency': latency.as_dict()
+                },
+            'timeseries': self.make_timeseries(iteration_start, latencies)
+            }
+        self._report_results(data_start_time, data_end_time, elapsed_time, user, system, extras)
 
 
 synctest_client().run_workload()
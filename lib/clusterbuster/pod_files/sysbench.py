@@ -2,11 +2,11 @@
 
 import os
 import subprocess
-import re
 import shutil
 import time
 
 from clusterbuster_pod_client import clusterbuster_pod_client
+from sysbench_parser import sysbench_parser, sysbench_interval_parser, SIMPLE_FIELDS, FILEIO_FIELDS
 
 
 class sysbench_client(clusterbuster_pod_client):
@@ -17,7 +17,6 @@ class sysbench_client(clusterbuster_pod_client):
     def __init__(self):
         try:
             super().__init__()
-            self.np = '([0-9]+([kmgt]i)?)b'
             self.drop_cache_service = self._args[0]
             self.drop_cache_port = int(self._args[1])
             self._set_processes(int(self._args[2]))
@@ -32,52 +31,36 @@ class sysbench_client(clusterbuster_pod_client):
                 self.sysbench_fileio_modes = self._splitStr(r'\s+', self._args[7])
             else:
                 self.sysbench_fileio_modes = ['sync']
-            self.sysbench_options = self._args[8:]
+            self.report_interval = int(self._args[8])
+            self.reuse_files = self._toBool(self._args[9])
+            self.sysbench_options = self._args[10:]
             self.runit_cpu = self.runit_simple
             self.runit_memory = self.runit_simple
             self.runit_mutex = self.runit_simple
             self.runit_threads = self.runit_simple
+            self.simple_parser = sysbench_parser(SIMPLE_FIELDS)
+            self.fileio_parser = sysbench_parser(FILEIO_FIELDS)
         except Exception as err:
             self._abort(f"Init failed! {err} {' '.join(self._args)}")
 
     def build_sysbench_cmd(self, command: str, *argv):
         args = ['sysbench', f'--time={self.runtime}', self.workload, command]
+        if command == 'run' and self.report_interval > 0:
+            args.append(f'--report-interval={self.report_interval}')
         args.extend(argv)
         args.extend(self.sysbench_options)
         return args
 
-    def simple_check1(self, m, op_answer: dict, key: str, multiplier: float, matchidx: int,
-                      is_float: bool, is_str: bool, is_int: bool):
-        if is_str:
-            op_answer[key] = m.group(matchidx)
-        elif is_float:
-            op_answer[key] = float(m.group(matchidx)) * multiplier
-        else:
-            op_answer[key] = self._toSize(m.group(matchidx)) * multiplier
-
-    def simple_check(self, pattern: str, line: str, op_answer: dict, key, multiplier=None, matchidx=None,
-                     is_float: bool = False, is_str: bool = False, is_int: bool = True):
-        m = re.match(pattern, line)
-        if not m:
-            return False
-        if isinstance(key, list):
-            if multiplier is None:
-                multiplier = [1.0 for i in range(len(key))]
-            elif isinstance(multiplier, int) or isinstance(multiplier, float):
-                multiplier = [multiplier for i in range(len(key))]
-            elif not isinstance(matchidx, list) or len(matchidx) < len(key):
-                raise Exception("Non-conformant multiplier")
-            if not isinstance(matchidx, list) or len(matchidx) < len(key):
-                raise Exception("Non-conformant multiplier")
-            for i in range(len(key)):
-                self.simple_check1(m, op_answer, key[i], multiplier[i], matchidx[i], is_float, is_str, is_int)
-        else:
-            if matchidx is None:
-                matchidx = 1
-            if multiplier is None:
-                multiplier = 1
-            self.simple_check1(m, op_answer, key, multiplier, matchidx, is_float, is_str, is_int)
-        return True
+    def fileio_command(self, command: str, test: str, mode: str):
+        """
+        Run a sysbench fileio prepare or cleanup command
+        :return: elapsed time
+        """
+        args = self.build_sysbench_cmd(command, f'--file-test-mode={test}', f'--file-io-mode={mode}')
+        self._timestamp(f'{command} {" ".join(args)}')
+        start = time.time()
+        subprocess.run(args, check=True)
+        return time.time() - start
 
     def runit_simple(self, process: int):
         args = self.build_sysbench_cmd('run')
@@ -89,40 +72,22 @@ class sysbench_client(clusterbuster_pod_client):
             'op_start': self._adjusted_time(),
             'workload': self.workload
             }
+        intervals = sysbench_interval_parser(self.report_interval)
         with subprocess.Popen(args, stdout=subprocess.PIPE) as run:
             line = run.stdout.readline().decode('ascii')
             while line:
                 line = line.strip().lower()
                 self._timestamp(line)
-                if self.simple_check(r'number of threads: *([0-9]+)', line, op_answer, 'threads'):
-                    pass
-                elif self.simple_check(r'events per second: *([0-9.]+)', line, op_answer, 'events_per_second', is_float=True):
-                    pass
-                elif self.simple_check(r'total time: *([0-9.]+)s', line, op_answer, 'elapsed_time', is_float=True):
-                    pass
-                elif self.simple_check(r'total number of events: *([0-9]+)', line, op_answer, 'total_events'):
-                    pass
-                elif self.simple_check(r'min: *([0-9.]+)', line, op_answer, 'min_latency_sec', is_float=True):
-                    pass
-                elif self.simple_check(r'avg: *([0-9.]+)', line, op_answer, 'avg_latency_sec', is_float=True):
-                    pass
-                elif self.simple_check(r'max: *([0-9.]+)', line, op_answer, 'max_latency_sec', is_float=True):
-                    pass
-                elif self.simple_check(r'95th percentile: *([0-9.]+)', line, op_answer, 'p95_latency_sec', is_float=True):
-                    pass
-                elif self.simple_check(r'events .avg/stddev.:\s*([0-9.]+)/([0-9.]+)', line,
-                                       op_answer, ['events_avg', 'events_stdev'],
-                                       matchidx=[1, 2], is_float=True):
-                    pass
-                elif self.simple_check(r'execution time .avg/stddev.:\s*([0-9.]+)/([0-9.]+)', line,
-                                       op_answer, ['time', 'time_stdev'],
-                                       matchidx=[1, 2], is_float=True):
-                    pass
+                if not intervals.parse(line):
+                    self.simple_parser.parse(line, op_answer)
                 line = run.stdout.readline().decode('ascii')
             status = run.poll()
             if status:
                 raise Exception(f"Sysbench failed: {status}")
         op_answer['op_end'] = self._adjusted_time()
+        timeseries = intervals.as_dict()
+        if timeseries:
+            op_answer['timeseries'] = timeseries
         data_end_time = self._adjusted_time()
         elapsed_time = data_end_time - data_start_time
         user, sys = self._cputimes(user, sys)
@@ -147,14 +112,27 @@ class sysbench_client(clusterbuster_pod_client):
         os.chdir(localrundir)
         data_start_time = self._adjusted_time()
         user, sys = self._cputimes()
+        preparation = {
+            'reuse_files': self.reuse_files,
+            'prepare_count': 0,
+            'prepare_time': 0,
+            'cleanup_count': 0,
+            'cleanup_time': 0
+            }
         for mode in self.sysbench_fileio_modes:
+            if self.reuse_files:
+                # The file set does not depend on the test mode, so one
+                # prepare serves every test for this I/O mode
+                self._sync_to_controller(f'{mode}+prepare')
+                preparation['prepare_time'] += self.fileio_command('prepare', self.sysbench_fileio_tests[0], mode)
+                preparation['prepare_count'] += 1
             for test in self.sysbench_fileio_tests:
-                self._sync_to_controller(f'{test}+{mode}+prepare')
-                args = self.build_sysbench_cmd('prepare', f'--file-test-mode={test}', f'--file-io-mode={mode}')
-                self._timestamp(f'Preparing {" ".join(args)}')
-                subprocess.run(args, check=True)
+                if not self.reuse_files:
+                    self._sync_to_controller(f'{test}+{mode}+prepare')
+                    preparation['prepare_time'] += self.fileio_command('prepare', test, mode)
+                    preparation['prepare_count'] += 1
 
-                self._drop_cache(self.drop_cache_service, self.drop_cache_port)
+                self._drop_cache()
                 self._sync_to_controller(f'{test}+{mode}+run')
                 op_user, op_sys = self._cputimes()
                 args = self.build_sysbench_cmd('run', f'--file-test-mode={test}', f'--file-io-mode={mode}')
@@ -166,63 +144,38 @@ class sysbench_client(clusterbuster_pod_client):
                     'rdwr_ratio': 1,
                     'op_start': self._adjusted_time()
                     }
+                intervals = sysbench_interval_parser(self.report_interval)
                 with subprocess.Popen(args, stdout=subprocess.PIPE) as run:
                     line = run.stdout.readline().decode('ascii')
                     while line:
                         line = line.strip().lower()
                         self._timestamp(line)
-                        if self.simple_check(rf'([0-9]+) *files, *{self.np}', line,
-                                             op_answer, ['files', 'filesize'], matchidx=[1, 2]):
-                            pass
-                        elif self.simple_check(rf'block size *{self.np}', line, op_answer, 'blocksize'):
-                            pass
-                        elif self.simple_check(r'read/write ratio for combined random io test: *([0-9]+(\.[0-9]+)?)',
-                                               line, op_answer, 'rdwr_ratio', is_float=True):
-                            pass
-                        elif self.simple_check(r'periodic fsync enabled, calling fsync.. each ([0-9]+)',
-                                               line, op_answer, 'fsync_frequency'):
-                            pass
-                        elif self.simple_check(r'calling fsync.. at the end of test, (enabled|disabled)',
-                                               line, op_answer, 'final_fsync_enabled', is_str=True):
-                            pass
-                        elif self.simple_check(r'using (.*) i/o mode', line, op_answer, 'io_mode', is_str=True):
-                            pass
-                        elif self.simple_check(r'reads/s: *([0-9.]+)', line, op_answer, 'read_ops'):
-                            pass
-                        elif self.simple_check(r'writes/s: *([0-9.]+)', line, op_answer, 'write_ops'):
-                            pass
-                        elif self.simple_check(r'fsyncs/s: *([0-9.]+)', line, op_answer, 'fsync_ops'):
-                            pass
-                        elif self.simple_check(r'read, mib/s: *([0-9.]+)', line, op_answer, 'read_rate_mb_sec'):
-                            pass
-                        elif self.simple_check(r'written, mib/s: *([0-9.]+)', line, op_answer, 'write_rate_mb_sec'):
-                            pass
-                        elif self.simple_check(r'total time: *([0-9.]+)s', line, op_answer, 'elapsed_time'):
-                            pass
-                        elif self.simple_check(r'min: *([0-9.]+)', line, op_answer, 'min_latency_sec'):
-                            pass
-                        elif self.simple_check(r'avg: *([0-9.]+)', line, op_answer, 'avg_latency_sec'):
-                            pass
-                        elif self.simple_check(r'max: *([0-9.]+)', line, op_answer, 'max_latency_sec'):
-                            pass
-                        elif self.simple_check(r'95th percentile: *([0-9.]+)', line, op_answer, 'p95_latency_sec'):
-                            pass
+                        if not intervals.parse(line):
+                            self.fileio_parser.parse(line, op_answer)
                         line = run.stdout.readline().decode('ascii')
                     status = run.poll()
                     if status:
                         raise Exception(f"Sysbench failed: {status}")
                 op_answer['op_end'] = self._adjusted_time()
+                timeseries = intervals.as_dict()
+                if timeseries:
+                    op_answer['timeseries'] = timeseries
                 op_answer['user_cpu_time'], op_answer['sys_cpu_time'] = self._cputimes(op_user, op_sys)
                 self._sync_to_controller(f'{test}+{mode}+finish')
-                args = self.build_sysbench_cmd('cleanup', f'--file-test-mode={test}', f'--file-io-mode={mode}')
-                self._timestamp(f'Cleanup {" ".join(args)}')
-                subprocess.run(args, check=True)
+                if not self.reuse_files:
+                    preparation['cleanup_time'] += self.fileio_command('cleanup', test, mode)
+                    preparation['cleanup_count'] += 1
                 op_answers[f'fileio+{test}+{mode}'] = op_answer
+        if self.reuse_files:
+            preparation['cleanup_time'] += self.fileio_command('cleanup', self.sysbench_fileio_tests[0],
+                                                               self.sysbench_fileio_modes[-1])
+            preparation['cleanup_count'] += 1
         data_end_time = self._adjusted_time()
         elapsed_time = data_end_time - data_start_time
         user, sys = self._cputimes(user, sys)
         extras = {
-            'workloads': op_answers
+            'workloads': op_answers,
+            'file_preparation': preparation
             }
         self._report_results(data_start_time, data_end_time, elapsed_time, user, sys, extras)
 
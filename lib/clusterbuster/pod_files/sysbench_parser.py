@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+
+# Copyright 2023 Robert Krawitz/Red Hat
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import re
+import sys
+import time
+from array import array
+
+
+def _to_size(value: str):
+    """
+    Parse a size with an optional binary suffix, as sysbench prints
+    file and block sizes (e.g. 16kib)
+    """
+    m = re.match(r'([0-9]+(\.[0-9]+)?)([kmgt]?)i?', value)
+    return int(float(m.group(1)) * (1024 ** ' kmgt'.index(m.group(3) or ' ')))
+
+
+# Typed setters for captured fields.  'trunc' truncates a decimal value
+# to an integer.
+FIELD_TYPES = {
+    'int': int,
+    'float': float,
+    'trunc': lambda value: int(float(value)),
+    'size': _to_size,
+    'str': str
+    }
+
+# Each entry is (pattern, [(key, type, group), ...]); patterns are
+# matched against the stripped, lowercased line, and the first matching
+# entry wins.
+_NP = '([0-9]+([kmgt]i)?)b'
+
+SIMPLE_FIELDS = [
+    (r'number of threads: *([0-9]+)', [('threads', 'int', 1)]),
+    (r'events per second: *([0-9.]+)', [('events_per_second', 'float', 1)]),
+    (r'total time: *([0-9.]+)s', [('elapsed_time', 'float', 1)]),
+    (r'total number of events: *([0-9]+)', [('total_events', 'int', 1)]),
+    (r'min: *([0-9.]+)', [('min_latency_sec', 'float', 1)]),
+    (r'avg: *([0-9.]+)', [('avg_latency_sec', 'float', 1)]),
+    (r'max: *([0-9.]+)', [('max_latency_sec', 'float', 1)]),
+    (r'95th percentile: *([0-9.]+)', [('p95_latency_sec', 'float', 1)]),
+    (r'events .avg/stddev.:\s*([0-9.]+)/([0-9.]+)', [('events_avg', 'float', 1), ('events_stdev', 'float', 2)]),
+    (r'execution time .avg/stddev.:\s*([0-9.]+)/([0-9.]+)', [('time', 'float', 1), ('time_stdev', 'float', 2)]),
+    ]
+
+FILEIO_FIELDS = [
+    (rf'([0-9]+) *files, *{_NP}', [('files', 'int', 1), ('filesize', 'size', 2)]),
+    (rf'block size *{_NP}', [('blocksize', 'size', 1)]),
+    (r'read/write ratio for combined random io test: *([0-9]+(\.[0-9]+)?)', [('rdwr_ratio', 'float', 1)]),
+    (r'periodic fsync enabled, calling fsync.. each ([0-9]+)', [('fsync_frequency', 'int', 1)]),
+    (r'calling fsync.. at the end of test, (enabled|disabled)', [('final_fsync_enabled', 'str', 1)]),
+    (r'using (.*) i/o mode', [('io_mode', 'str', 1)]),
+    (r'reads/s: *([0-9.]+)', [('read_ops', 'trunc', 1)]),
+    (r'writes/s: *([0-9.]+)', [('write_ops', 'trunc', 1)]),
+    (r'fsyncs/s: *([0-9.]+)', [('fsync_ops', 'trunc', 1)]),
+    (r'read, mib/s: *([0-9.]+)', [('read_rate_mb_sec', 'trunc', 1)]),
+    (r'written, mib/s: *([0-9.]+)', [('write_rate_mb_sec', 'trunc', 1)]),
+    (r'total time: *([0-9.]+)s', [('elapsed_time', 'trunc', 1)]),
+    (r'min: *([0-9.]+)', [('min_latency_sec', 'trunc', 1)]),
+    (r'avg: *([0-9.]+)', [('avg_latency_sec', 'trunc', 1)]),
+    (r'max: *([0-9.]+)', [('max_latency_sec', 'trunc', 1)]),
+    (r'95th percentile: *([0-9.]+)', [('p95_latency_sec', 'trunc', 1)]),
+    ]
+
+
+class sysbench_parser:
+    """
+    Parse sysbench output with a table of patterns compiled into a
+    single alternation, so that each line is scanned once rather than
+    once per pattern.
+    """
+
+    def __init__(self, table: list):
+        alternatives = []
+        self.__setters = {}
+        group = 1
+        for index, (pattern, fields) in enumerate(table):
+            name = f'_f{index}'
+            alternatives.append(f'(?P<{name}>{pattern})')
+            # Groups within each alternative are numbered after its
+            # enclosing named group.
+            self.__setters[name] = [(key, FIELD_TYPES[field_type], group + idx) for key, field_type, idx in fields]
+            group += re.compile(pattern).groups + 1
+        self.__regexp = re.compile('|'.join(alternatives))
+
+    def parse(self, line: str, answer: dict):
+        """
+        Parse one line, storing any fields found in answer
+        :param line: stripped, lowercased line of sysbench output
+        :return: True if the line matched
+        """
+        m = self.__regexp.match(line)
+        if not m:
+            return False
+        for key, setter, group in self.__setters[m.lastgroup]:
+            answer[key] = setter(m.group(group))
+        return True
+
+
+class sysbench_interval_parser:
+    """
+    Collect the per-interval lines that sysbench prints with
+    --report-interval, e.g.
+        [ 1s ] thds: 4 eps: 4693.72 lat (ms,95%): 0.87
+        [ 1s ] reads: 19.29 mib/s writes: 12.86 mib/s fsyncs: 2634.12/s latency (ms,95%): 0.870
+    into columns.  Throughput is events (or transactions) per second,
+    or for fileio, bytes read and written per second.
+    """
+    __interval_re = re.compile(r'\[ *([0-9.]+)s *\] ')
+    __field_re = re.compile(r'(eps|tps|reads|writes|fsyncs): *([0-9.]+)|lat(?:ency)? \(ms,([0-9.]+)%\): *([0-9.]+)')
+
+    def __init__(self, interval: float):
+        self.__interval = interval
+        self.__latency_percentile = None
+        self.__is_fileio = False
+        self.__columns = {key: array('d') for key in ['time', 'throughput', 'latency_sec',
+                                                      'read_bytes_sec', 'write_bytes_sec', 'fsyncs_sec']}
+
+    def parse(self, line: str):
+        """
+        Parse one stripped, lowercased line
+        :return: True if the line was an interval report
+        """
+        m = self.__interval_re.match(line)
+        if not m:
+            return False
+        values = {'throughput': 0, 'latency_sec': 0, 'read_bytes_sec': 0, 'write_bytes_sec': 0, 'fsyncs_sec': 0}
+        for field in self.__field_re.finditer(line, m.end()):
+            key = field.group(1)
+            if key is None:
+                self.__latency_percentile = float(field.group(3))
+                values['latency_sec'] = float(field.group(4)) / 1000
+            elif key == 'reads' or key == 'writes':
+                self.__is_fileio = True
+                values[f'{key[:-1]}_bytes_sec'] = float(field.group(2)) * 1048576
+            elif key == 'fsyncs':
+                values['fsyncs_sec'] = float(field.group(2))
+            else:
+                values['throughput'] = float(field.group(2))
+        if self.__is_fileio:
+            values['throughput'] = values['read_bytes_sec'] + values['write_bytes_sec']
+        self.__columns['time'].append(float(m.group(1)))
+        for key, value in values.items():
+            self.__columns[key].append(value)
+        return True
+
+    def as_dict(self):
+        """
+        :return: JSON-serializable timeseries, or None if no intervals
+                 were reported
+        """
+        if not self.__columns['time']:
+            return None
+        answer = {
+            'interval': self.__interval,
+            'throughput_units': 'B/sec' if self.__is_fileio else 'events/sec',
+            'latency_percentile': self.__latency_percentile
+            }
+        for key, column in self.__columns.items():
+            if self.__is_fileio or key in ['time', 'throughput', 'latency_sec']:
+                answer[key] = column.tolist()
+        return answer
+
+
+def _benchmark(iterations: int = 20000):
+    """
+    Report the per-line cost of the combined pattern against matching
+    each pattern in turn.
+    """
+    sample = """
+number of threads: 4
+read/write ratio for combined random io test: 1.50
+periodic fsync enabled, calling fsync() each 100 requests.
+calling fsync() at the end of test, enabled.
+using synchronous i/o mode
+128 files, 16mib each
+block size 16kib
+reads/s:                      1234.56
+writes/s:                     823.04
+fsyncs/s:                     2634.12
+read, mib/s:                  19.29
+written, mib/s:               12.86
+events per second: 4693.72
+total time:                          10.0012s
+total number of events:              46955
+min:                                    0.00
+avg:                                    0.21
+max:                                   12.34
+95th percentile:                        0.87
+events (avg/stddev):           11738.7500/23.45
+execution time (avg/stddev):   9.9722/0.01
+threads started!
+"""
+    lines = [line.strip().lower() for line in sample.splitlines() if line.strip()]
+    for name, table in [('simple', SIMPLE_FIELDS), ('fileio', FILEIO_FIELDS)]:
+        parser = sysbench_parser(table)
+        compiled = [(re.compile(pattern), fields) for pattern, fields in table]
+
+        def sequential(line: str, answer: dict):
+            for regexp, fields in compiled:
+                m = regexp.match(line)
+                if m:
+                    for key, field_type, group in fields:
+                        answer[key] = FIELD_TYPES[field_type](m.group(group))
+                    return True
+            return False
+
+        for label, func in [('combined', parser.parse), ('sequential', sequential)]:
+            answer = {}
+            start = time.perf_counter()
+            for i in range(iterations):
+                for line in lines:
+                    func(line, answer)
+            elapsed = time.perf_counter() - start
+            print('%-6s %-10s %8.3f usec/line' % (name, label, elapsed * 1000000 / (iterations * len(lines))))
+
+
+if __name__ == '__main__':
+    _benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
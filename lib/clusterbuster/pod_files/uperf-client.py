@@ -1,11 +1,23 @@
 #!/usr/bin/env python3
 
 import os
+import time
+import random
+import socket
 import subprocess
 import re
+from array import array
+from bisect import bisect_left
 
 from clusterbuster_pod_client import clusterbuster_pod_client
 
+# uperf emits one sample line per transaction and thread every interval;
+# these are matched as bytes to avoid decoding every line.  Other
+# lines are rare.
+SAMPLE_RE = re.compile(rb'timestamp_ms:([0-9.]+) +name:([0-9a-zA-Z]+) +nr_bytes:([0-9]+) +nr_ops:([0-9]+)')
+OP_SUMMARY_RE = re.compile(r'(Txn1|write|read)\s')
+TIME_RE = re.compile(r'([0-9]+(\.[0-9]*)?)(ns|us|ms|s)$')
+
 
 class uperf_client(clusterbuster_pod_client):
     """
@@ -19,19 +31,53 @@ class uperf_client(clusterbuster_pod_client):
             self.ramp_time = int(self._args[1])
             self.srvhost = self._resolve_host(self._args[2])
             self.connect_port = int(self._args[3])
-            self.tests = self._args[4:]
+            self.timeseries_interval = float(self._args[4])
+            self.tests = self._args[5:]
             self.podfile_dir = os.environ.get('SYSTEM_PODFILE_DIR', '.')
             self.process_file(os.path.join(self.podfile_dir, "uperf-mini.xml"),
                               "/tmp/uperf-test.xml", {'srvhost': self.srvhost, 'runtime': 1})
             self._timestamp(f"Waiting for uperf server {self.srvhost}:{self.connect_port} to come online...")
-            subprocess.run(f'until uperf -P "{self.connect_port}" -m /tmp/uperf-test.xml; do sleep 1; done', shell=True)
-            self._timestamp("Connected to uperf server")
+            self.server_wait_time = self.wait_for_server()
+            self._timestamp(f"Connected to uperf server after {round(self.server_wait_time, 3)} seconds")
         except Exception as err:
             self._abort(f"Init failed! {err} {' '.join(self._args)}")
 
+    def probe_server(self, timeout: float = 0.5):
+        """
+        :return: True if the uperf server port accepts a TCP connection
+        """
+        try:
+            with socket.create_connection((self.srvhost, self.connect_port), timeout=timeout):
+                return True
+        except OSError:
+            return False
+
+    def wait_for_server(self, max_delay: float = 1.0):
+        """
+        Wait for the uperf server to accept connections, backing off
+        with jitter between attempts so that many clients do not probe
+        in lockstep, and then validate it with the uperf mini-test.
+        :return: time in seconds spent waiting for the server
+        """
+        start = time.time()
+        delay = 0.05
+        while True:
+            attempts = 0
+            while not self.probe_server():
+                attempts += 1
+                if attempts == 1 or attempts % 100 == 0:
+                    self._timestamp(f"uperf server not yet listening after {attempts} attempt(s)")
+                time.sleep(random.uniform(delay / 2, delay))
+                delay = min(delay * 2, max_delay)
+            if subprocess.run(['uperf', '-P', str(self.connect_port), '-m', '/tmp/uperf-test.xml']).returncode == 0:
+                return time.time() - start
+            self._timestamp("uperf mini-test failed, retrying")
+            time.sleep(random.uniform(delay / 2, delay))
+            delay = min(delay * 2, max_delay)
+
     def compute_seconds_uperf(self, value: str):
         # Specific to uperf, which defaults to milliseconds
-        m = re.match(r'([0-9]+(\.[0-9]*)?)(ns|us|ms|s)$', value)
+        m = TIME_RE.match(value)
         if m:
             base = float(m.group(1))
             modifier = m.group(3)
@@ -54,6 +100,88 @@ class uperf_client(clusterbuster_pod_client):
         with open(outfile, 'w') as outdata:
             outdata.write(contents)
 
+    def summarize_samples(self, summary: dict, times: array, deltas: array, nbytes: array, nops: array):
+        """
+        Compute statistics over the samples outside the ramp up and
+        ramp down periods in a single pass.  Runs shorter than 10
+        seconds are not trimmed.
+        """
+        if summary['raw_elapsed_time'] < 10:
+            first, last = 0, len(times)
+        else:
+            first = bisect_left(times, self.ramp_time)
+            last = bisect_left(times, summary['raw_elapsed_time'] - self.ramp_time)
+        total_bytes = 0
+        total_ops = 0
+        elapsed_time = 0
+        ops_sec_sum = 0
+        ops_sec_sq_sum = 0
+        bytes_sec_sum = 0
+        bytes_sec_sq_sum = 0
+        stdev_counter = 0
+        for idx in range(first, last):
+            delta = deltas[idx]
+            sample_bytes = nbytes[idx]
+            sample_ops = nops[idx]
+            total_bytes += sample_bytes
+            total_ops += sample_ops
+            elapsed_time += delta
+            if delta > 0:
+                ops_sec = sample_ops / delta
+                bytes_sec = sample_bytes / delta
+                ops_sec_sum += ops_sec
+                ops_sec_sq_sum += ops_sec * ops_sec
+                bytes_sec_sum += bytes_sec
+                bytes_sec_sq_sum += bytes_sec * bytes_sec
+                stdev_counter += 1
+        summary['nbytes'] = int(total_bytes)
+        summary['nops'] = int(total_ops)
+        summary['elapsed_time'] = elapsed_time
+        summary['avg_bytes_sec'] = 0
+        summary['avg_ops_sec'] = 0
+        if elapsed_time > 0:
+            summary['avg_bytes_sec'] = total_bytes / elapsed_time
+            summary['avg_ops_sec'] = total_ops / elapsed_time
+            summary['bytes_sec_sq_sum'] = bytes_sec_sq_sum
+            summary['bytes_sec_sum'] = bytes_sec_sum
+            summary['ops_sec_sq_sum'] = ops_sec_sq_sum
+            summary['ops_sec_sum'] = ops_sec_sum
+            if stdev_counter >= 2:
+                summary['stdev_bytes_sec'] = max((bytes_sec_sq_sum / stdev_counter) - (summary['avg_bytes_sec'] ** 2), 0) ** 0.5
+                summary['stdev_ops_sec'] = max((ops_sec_sq_sum / stdev_counter) - (summary['avg_ops_sec'] ** 2), 0) ** 0.5
+            else:
+                summary['stdev_bytes_sec'] = 0
+                summary['stdev_ops_sec'] = 0
+
+    def make_timeseries(self, times: array, deltas: array, nbytes: array, nops: array):
+        """
+        Build the reported timeseries, merging consecutive samples into
+        intervals of at least timeseries_interval seconds if requested.
+        """
+        timeseries = []
+        if self.timeseries_interval <= 0:
+            for idx in range(len(times)):
+                timeseries.append({
+                    'time': times[idx],
+                    'timedelta': deltas[idx],
+                    'nbytes': int(nbytes[idx]),
+                    'nops': int(nops[idx])
+                    })
+            return timeseries
+        point = None
+        for idx in range(len(times)):
+            if point is None:
+                point = {'time': times[idx], 'timedelta': 0, 'nbytes': 0, 'nops': 0}
+            point['timedelta'] += deltas[idx]
+            point['nbytes'] += int(nbytes[idx])
+            point['nops'] += int(nops[idx])
+            if point['timedelta'] >= self.timeseries_interval:
+                timeseries.append(point)
+                point = None
+        if point is not None:
+            timeseries.append(point)
+        return timeseries
+
     def runit(self, process: int):
         ucpu, scpu = self._cputimes()
         counter = 1
@@ -101,47 +229,40 @@ class uperf_client(clusterbuster_pod_client):
                 last_time = 0
                 last_nbytes = 0
                 last_nops = 0
-                timeseries = []
-                threads = dict()
+                times = array('d')
+                deltas = array('d')
+                nbytes_samples = array('d')
+                nops_samples = array('d')
                 summary = {
                     'write': {},
                     'read': {},
                     'total': {}
                     }
                 failure_message = ''
-                line = run.stdout.readline().decode('ascii')
-                while line:
-                    line = line.strip()
-                    m = re.match(r'timestamp_ms:([0-9.]+) +name:([0-9a-zA-Z]+) +nr_bytes:([0-9]+) +nr_ops:([0-9]+)', line)
-                    if m:
+                for line in run.stdout:
+                    if line.startswith(b'timestamp_ms:'):
+                        m = SAMPLE_RE.match(line)
+                        if not m:
+                            continue
                         ts = float(m.group(1)) / 1000.0
                         if first_time == 0:
                             first_time = ts
                             last_time = ts
-                        name = m.group(2)
-                        nbytes = int(m.group(3))
-                        nops = int(m.group(4))
-                        # We only care about Txn2 and threads; the other transactions are start
-                        # and finish, and we want to ignore those
-                        if name == 'Txn2':
-                            row = {
-                                'time': ts - first_time,
-                                'timedelta': ts - last_time,
-                                'nbytes': nbytes - last_nbytes,
-                                'nops': nops - last_nops
-                                }
-                            timeseries.append(row)
+                        # We only care about Txn2; the other transactions are start
+                        # and finish, and the per-thread samples are not reported
+                        if m.group(2) == b'Txn2':
+                            nbytes = int(m.group(3))
+                            nops = int(m.group(4))
+                            times.append(ts - first_time)
+                            deltas.append(ts - last_time)
+                            nbytes_samples.append(nbytes - last_nbytes)
+                            nops_samples.append(nops - last_nops)
                             last_time = ts
                             last_nbytes = nbytes
                             last_nops = nops
-                        elif re.match(r'Thr([0-9]+)', name):
-                            row = {
-                                'time': ts - first_time,
-                                'nbytes': nbytes,
-                                'nops': nops
-                                }
-                            threads[name] = row
-                    elif re.match(r'(Txn1|write|read)\s', line):
+                        continue
+                    line = line.decode('ascii', errors='replace').strip()
+                    if OP_SUMMARY_RE.match(line):
                         [op, count, avg, cpu, maximum, minimum] = line.split()
                         if op == 'Txn1':
                             op = 'total'
@@ -155,10 +276,7 @@ class uperf_client(clusterbuster_pod_client):
                         failed_cases.append(test_name)
                     elif line.startswith('*'):
                         self._timestamp(line)
-                    else:
-                        pass
-                    line = run.stdout.readline().decode('ascii')
-                status = run.poll()
+                status = run.wait()
                 if failed or status:
                     failure_message = f"Uperf failed: {status}"
                     failed = True
@@ -170,42 +288,8 @@ class uperf_client(clusterbuster_pod_client):
             if summary['raw_elapsed_time'] > 0:
                 summary['raw_avg_ops_sec'] = summary['raw_nops'] / summary['raw_elapsed_time']
                 summary['raw_avg_bytes_sec'] = summary['raw_nbytes'] / summary['raw_elapsed_time']
-            summary['nbytes'] = 0
-            summary['nops'] = 0
-            summary['elapsed_time'] = 0
-            summary['avg_bytes_sec'] = 0
-            summary['avg_ops_sec'] = 0
-            ops_sec_sum = 0
-            ops_sec_sq_sum = 0
-            bytes_sec_sum = 0
-            bytes_sec_sq_sum = 0
-            stdev_counter = 0
-            for point in timeseries:
-                if summary['raw_elapsed_time'] < 10 or (point['time'] >= self.ramp_time and
-                                                        point['time'] < summary['raw_elapsed_time'] - self.ramp_time):
-                    summary['nbytes'] += point['nbytes']
-                    summary['nops'] += point['nops']
-                    summary['elapsed_time'] += point['timedelta']
-                    ops_sec = point['nops'] / point['timedelta']
-                    bytes_sec = point['nbytes'] / point['timedelta']
-                    ops_sec_sum += ops_sec
-                    ops_sec_sq_sum += ops_sec ** 2
-                    bytes_sec_sum += bytes_sec
-                    bytes_sec_sq_sum += bytes_sec ** 2
-                    stdev_counter += 1
-            if summary['elapsed_time'] > 0:
-                summary['avg_bytes_sec'] = summary['nbytes'] / summary['elapsed_time']
-                summary['avg_ops_sec'] = summary['nops'] / summary['elapsed_time']
-                summary['bytes_sec_sq_sum'] = bytes_sec_sq_sum
-                summary['bytes_sec_sum'] = bytes_sec_sum
-                summary['ops_sec_sq_sum'] = ops_sec_sq_sum
-                summary['ops_sec_sum'] = ops_sec_sum
-                if stdev_counter >= 2:
-                    summary['stdev_bytes_sec'] = ((bytes_sec_sq_sum / stdev_counter) - (summary['avg_bytes_sec'] ** 2)) ** 0.5
-                    summary['stdev_ops_sec'] = ((ops_sec_sq_sum / stdev_counter) - (summary['avg_ops_sec'] ** 2)) ** 0.5
-                else:
-                    summary['stdev_bytes_sec'] = 0
-                    summary['stdev_ops_sec'] = 0
+            self.summarize_samples(summary, times, deltas, nbytes_samples, nops_samples)
+            timeseries = self.make_timeseries(times, deltas, nbytes_samples, nops_samples)
             summary['job_start_time'] = job_start_time
             summary['job_end_time'] = job_end_time
             case = {
@@ -225,6 +309,7 @@ class uperf_client(clusterbuster_pod_client):
             cases[test_name] = case
         results['results'] = cases
         results['failed'] = failed_cases
+        results['server_wait_time'] = self.server_wait_time
         ucpu, scpu = self._cputimes(ucpu, scpu)
         self._report_results(data_start_time, data_end_time, elapsed_time, ucpu, scpu, results)
 
@@ -32,9 +32,12 @@ class files_loader(LoadOneReport):
         direct = job_metadata['files_direct']
         self._MakeHierarchy(self._data, ['files', self._count, dirs, files, blocksize, blocks, direct, self._name])
         root = self._data['files'][self._count][dirs][files][blocksize][blocks][direct][self._name]
-        for op in ['create', 'read', 'remove']:
+        for op in ['create', 'read', 'remove', 'mixed']:
+            if op not in self._summary:
+                continue
             self._MakeHierarchy(root, [op])
             root[op]['elapsed_time'] = self._summary[op]['operation_elapsed_time']
             root[op]['cpu_time'] = self._summary[op]['cpu_time']
             root[op]['cpu_utilization'] = root[op]['cpu_time'] / root[op]['elapsed_time']
-        root['read']['io_throughput'] = self._summary['read']['data_rate']
+        if 'read' in self._summary:
+            root['read']['io_throughput'] = self._summary['read']['data_rate']
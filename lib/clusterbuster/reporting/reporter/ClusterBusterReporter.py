@@ -147,12 +147,14 @@ class ClusterBusterReporter:
     def __init__(self, jdata: dict, report_format: str, indent: int = 2, report_width=78):
         """
         Initializer for generic ClusterBuster report
-        :param jdata: JSON data to report
+        :param jdata: JSON data to report.  This is not copied and must not
+                      be modified; derived values belong in the summary
+                      and output rows.
         :param report_format: Report format, one of json-summary, json, json-verbose, verbose, summary
         :param indent: Per-level indentation
         :param report_width: Width of the report
         """
-        self._jdata = deepcopy(jdata)
+        self._jdata = jdata
         self._format = report_format
         self._all_clients_are_on_the_same_node = self.__are_clients_all_on_same_node()
         self._found_pods = {}
@@ -163,15 +165,23 @@ class ClusterBusterReporter:
         self._rows = []
         self._timeline_vars = []
         self._accumulator_vars = []
+        self._histogram_vars = {}
         self._summary_indent = indent
         self._report_width = report_width
         self._verbose_indent = 0
         self._header_keys = {}
         self._fields_to_copy = []
+        self._timeline_accessors = None
+        self._copy_accessors = None
+        self._accumulator_accessors = None
+        self._histogram_accessors = None
+        self._pod_nodes = None
         self._expect_row_data = True
         self._add_explicit_timeline_vars(['data_start_time', 'data_end_time', 'pod_start_time', 'pod_create_time'])
         self._add_accumulators(['user_cpu_time', 'system_cpu_time', 'cpu_time', 'data_elapsed_time',
-                                'timing_parameters.sync_rtt_delta'])
+                                'timing_parameters.sync_rtt_delta',
+                                'drop_cache.requests', 'drop_cache.drops', 'drop_cache.wait_time',
+                                'drop_cache.longest_wait_time', 'drop_cache.drop_time'])
 
     def create_report(self):
         """
@@ -267,6 +277,22 @@ class ClusterBusterReporter:
                                                                  precision=3, suffix='sec')
             offset_error = timing['second_controller_ts'] - timing['first_controller_ts']
             results['Max sync offset error'] = self._prettyprint(offset_error, precision=3, suffix='sec')
+        if 'drop_cache' in self._summary:
+            drop_cache = self._summary['drop_cache']
+            results['Drop cache'] = {
+                'Requests': drop_cache['requests'],
+                'Drops': self._prettyprint(drop_cache['drops'], precision=1, base=0),
+                'Requests per drop': self._prettyprint(self._safe_div(drop_cache['requests'], drop_cache['drops'],
+                                                                      number_only=True),
+                                                       precision=3, base=0),
+                'Average drop latency': self._prettyprint(self._safe_div(drop_cache['drop_time'], drop_cache['requests'],
+                                                                         number_only=True),
+                                                          precision=3, suffix='sec'),
+                'Average wait time': self._prettyprint(self._safe_div(drop_cache['wait_time'], drop_cache['requests'],
+                                                                      number_only=True),
+                                                       precision=3, suffix='sec'),
+                'Max wait time': self._prettyprint(drop_cache['max_longest_wait_time'], precision=3, suffix='sec')
+                }
 
     def _generate_row(self, results, row: dict):
         """
@@ -301,12 +327,24 @@ class ClusterBusterReporter:
             rowhash['container'] = row['container']
             rowhash['node'] = self.__find_node_for_pod(namespace=row['namespace'], pod=row['pod'])
             rowhash['process_id'] = row['process_id']
-            for var in self._timeline_vars:
-                self.__update_timeline_val(var, row, self._summary)
-            for field_to_copy in self._fields_to_copy:
-                self.__copy_field(field_to_copy, row, self._summary, rowhash)
-            for accumulator in self._accumulator_vars:
-                self.__update_accumulator_val(accumulator, row, self._summary, rowhash)
+            if self._accumulator_accessors is None:
+                self.__compile_accessors()
+            for path, accessors in self._timeline_accessors:
+                for node in self.__resolve_path(path, row, self._summary, rowhash):
+                    for accessor in accessors:
+                        self.__update_timeline_val(accessor, *node)
+            for path, accessors in self._copy_accessors:
+                for node in self.__resolve_path(path, row, self._summary, rowhash):
+                    for accessor in accessors:
+                        self.__copy_field(accessor, *node)
+            for path, accessors in self._accumulator_accessors:
+                for node in self.__resolve_path(path, row, self._summary, rowhash):
+                    for accessor in accessors:
+                        self.__update_accumulator_val(accessor, *node)
+            for path, accessors in self._histogram_accessors:
+                for node in self.__resolve_path(path, row, self._summary, rowhash):
+                    for accessor in accessors:
+                        self.__update_histogram_val(accessor, *node)
 
         self._rows.append(rowhash)
         return len(self._rows)-1
@@ -339,6 +377,8 @@ class ClusterBusterReporter:
             self._summary['overlap_error'] = self._safe_div(((self._summary['data_start_interval'] +
                                                               self._summary['data_end_interval']) / 2),
                                                             self._summary['elapsed_time_average'])
+        for histogram, percentiles in self._histogram_vars.items():
+            self.__finalize_histogram_val(histogram, self._summary, percentiles)
         if 'metrics' in self._jdata:
             metrics = PrometheusMetrics(self._jdata['metrics'])
             self._summary['metrics'] = {}
@@ -421,6 +461,27 @@ class ClusterBusterReporter:
         """
         self._accumulator_vars.extend(accumulators)
 
+    def _add_histograms(self, histograms: list, percentiles: list = None):
+        """
+        Add report variables that are latency histograms, as generated by
+        cb_histogram in the pods.  Histograms are merged bucket by bucket
+        across all rows; <var>_histogram holds the merged histogram in
+        the summary, and <var> holds count, min, mean, max, and the
+        requested percentiles in the summary and in each row.
+
+        Variables may be dotted components, in which case they are extracted
+        from the JSON structure.
+
+        Variables in this list that are not present in the output are ignored.
+
+        :param histograms: List of variables to add
+        :param percentiles: List of percentiles to report (default 50, 90, 99, 99.9)
+        """
+        if percentiles is None:
+            percentiles = [50, 90, 99, 99.9]
+        for histogram in histograms:
+            self._histogram_vars[histogram] = percentiles
+
     def _add_fields_to_copy(self, fields_to_copy: list):
         """
         Add report variables that are copied into result rows.
@@ -601,10 +662,13 @@ class ClusterBusterReporter:
         :param pod: Name of the pod.
         :return:
         """
-        for obj in self._jdata['api_objects']:
-            if obj['kind'] == 'Pod' and obj['metadata']['namespace'] == namespace and obj['metadata']['name'] == pod:
-                return obj['spec']['nodeName']
-        return None
+        if self._pod_nodes is None:
+            self._pod_nodes = {}
+            for obj in self._jdata['api_objects']:
+                if obj['kind'] == 'Pod':
+                    self._pod_nodes.setdefault((obj['metadata']['namespace'], obj['metadata']['name']),
+                                               obj['spec']['nodeName'])
+        return self._pod_nodes.get((namespace, pod))
 
     def __row_name(self, row: dict):
         """
@@ -618,81 +682,132 @@ class ClusterBusterReporter:
         else:
             return ''
 
-    def __copy_field(self, var: str, row, summary, rowhash: dict, orig_var: str = None):
+    def __resolve_path(self, path: tuple, row, summary: dict, rowhash: dict):
         """
-        Copy one field from an input row to an output row.  This recurses for deep copy.
-        :param var: Name of variable to copy
+        Follow the path of a compiled variable through an input row,
+        creating the corresponding dictionaries in the summary and the
+        output row as needed.  Lists in the input are flattened; each
+        element is followed with the same summary and output row.
+        :param path: Components of the variable, less the last
         :param row: Input row from JSON
+        :param summary: Summary of report
         :param rowhash: Output row
-        :param orig_var: Full name of variable to copy; default to var
+        :return: List of (row, summary, rowhash) containing the variable
         """
-        if orig_var is None:
-            orig_var = var
-        components = var.split('.', 1)
-        if len(components) > 1:
-            if components[0] not in row:
-                return
-            if (isinstance(row[components[0]], list)):
-                for element in row[components[0]]:
-                    self.__copy_field(components[1], element, summary, rowhash, orig_var=orig_var)
-            else:
-                if components[0] not in rowhash:
-                    rowhash[components[0]] = {}
-                if components[0] not in summary:
-                    summary[components[0]] = {}
-                self.__copy_field(components[1], row[components[0]], summary[components[0]],
-                                  rowhash[components[0]], orig_var=orig_var)
-
-        if len(components) > 1:
-            if components[0] not in rowhash:
-                [components[0]] = {}
-            if components[0] not in summary:
-                summary[components[0]] = {}
-            self.__copy_field(components[1], row[components[0]], summary[components[0]],
-                              rowhash[components[0]], orig_var=orig_var)
-        else:
-            self._copy_formatted_value(var, rowhash, row, orig_var=orig_var)
-            self._copy_formatted_value(var, summary, row, dont_overwrite=True, orig_var=orig_var)
+        nodes = [(row, summary, rowhash)]
+        for component in path:
+            next_nodes = []
+            for row, summary, rowhash in nodes:
+                if component not in row:
+                    continue
+                val = row[component]
+                if isinstance(val, list):
+                    for element in val:
+                        next_nodes.append((element, summary, rowhash))
+                else:
+                    if component not in summary:
+                        summary[component] = {}
+                    if component not in rowhash:
+                        rowhash[component] = {}
+                    next_nodes.append((val, summary[component], rowhash[component]))
+            if not next_nodes:
+                return next_nodes
+            nodes = next_nodes
+        return nodes
+
+    def __compile_accessors(self):
+        """
+        Compile each registered variable once, so that the paths
+        and synthesized names need not be recomputed for every row.
+        Each accessor is a tuple of the names that its update uses.
+        Consecutive variables with the same path (all but the last
+        component) are grouped, so that each path is only followed
+        once per row; variables are still updated in the order in which
+        they were registered.
+        """
+        def compile_path(var: str):
+            components = var.split('.')
+            return tuple(components[:-1]), components[-1]
+
+        def group(accessors: list):
+            answer = []
+            for path, accessor in accessors:
+                if answer and answer[-1][0] == path:
+                    answer[-1][1].append(accessor)
+                else:
+                    answer.append((path, [accessor]))
+            return answer
 
-    def __update_timeline_val(self, var: str, row, summary: dict):
+        self._timeline_accessors = []
+        for var in self._timeline_vars:
+            path, leaf = compile_path(var)
+            m = re.search(r'(.*)_(start|end)$', leaf)
+            if m:
+                mvar = m.group(1)
+                names = (f'{mvar}_elapsed_time', f'{mvar}_start', f'{mvar}_end',
+                         f'last_{mvar}_end', f'first_{mvar}_start')
+            else:
+                names = None
+            self._timeline_accessors.append((path, (leaf, f'first_{leaf}', f'last_{leaf}',
+                                                    leaf.endswith('_start'), leaf.endswith('_end'), names)))
+        self._copy_accessors = []
+        for var in self._fields_to_copy:
+            path, leaf = compile_path(var)
+            self._copy_accessors.append((path, (leaf, leaf.split(':', 1)[0], var)))
+        self._accumulator_accessors = []
+        for var in self._accumulator_vars:
+            path, leaf = compile_path(var)
+            self._accumulator_accessors.append((path, (leaf, f'{leaf}_counter', f'{leaf}_sq', f'stdev_{leaf}',
+                                                       f'max_{leaf}', f'min_{leaf}', f'avg_{leaf}')))
+        self._histogram_accessors = []
+        for var, percentiles in self._histogram_vars.items():
+            path, leaf = compile_path(var)
+            self._histogram_accessors.append((path, (leaf, f'{leaf}_histogram', percentiles)))
+        self._timeline_accessors = group(self._timeline_accessors)
+        self._copy_accessors = group(self._copy_accessors)
+        self._accumulator_accessors = group(self._accumulator_accessors)
+        self._histogram_accessors = group(self._histogram_accessors)
+
+    def __copy_field(self, accessor: tuple, row, summary, rowhash: dict):
         """
-        Update one summary timeline value.  This recurses for deep copy.
-        :param var: Name of variable to update
+        Copy one field from an input row to an output row.
+        :param accessor: Compiled variable to copy
         :param row: Input row from JSON
         :param summary: Summary of report
+        :param rowhash: Output row
         """
-        components = var.split('.', 1)
-        if len(components) > 1:
-            if components[0] not in row:
-                return
-            if (isinstance(row[components[0]], list)):
-                for element in row[components[0]]:
-                    self.__update_timeline_val(components[1], element, summary)
-            else:
-                if components[0] not in summary:
-                    summary[components[0]] = {}
-                self.__update_timeline_val(components[1], row[components[0]], summary[components[0]])
-        else:
-            row_val = row[var]
-            mvar = None
-            m = re.search(r'(.*)_(start|end)$', var)
-            if m:
-                mvar = f'{m.group(1)}'
-                tvar = f'{mvar}_elapsed_time'
-                svar = f'{mvar}_start'
-                evar = f'{mvar}_end'
-                if tvar not in row and svar in row and evar in row:
-                    row[tvar] = row[evar] - row[svar]
-            if f'first_{var}' not in summary or row_val < summary[f'first_{var}']:
-                summary[f'first_{var}'] = row_val
-                if var.endswith('_start'):
-                    summary[var] = row_val
-            if f'last_{var}' not in summary or row_val > summary[f'last_{var}']:
-                summary[f'last_{var}'] = row_val
-                if var.endswith('_end'):
-                    summary[var] = row_val
-            if mvar and f'last_{evar}' in summary and f'first_{svar}' in summary:
-                summary[tvar] = summary[f'last_{evar}'] - summary[f'first_{svar}']
+        var, rvar, orig_var = accessor
+        # Values derived from the input (such as elapsed times synthesized
+        # from timeline variables) are only present in the output row.
+        if rvar not in row:
+            row = rowhash
+        self._copy_formatted_value(var, rowhash, row, orig_var=orig_var)
+        self._copy_formatted_value(var, summary, row, dont_overwrite=True, orig_var=orig_var)
+
+    def __update_timeline_val(self, accessor: tuple, row, summary: dict, rowhash: dict):
+        """
+        Update one summary timeline value.
+        :param accessor: Compiled timeline variable
+        :param row: Input row from JSON
+        :param summary: Summary of report
+        :param rowhash: Output row
+        """
+        var, first_var, last_var, is_start, is_end, names = accessor
+        row_val = row[var]
+        if names:
+            tvar, svar, evar, last_evar, first_svar = names
+            if tvar not in row and svar in row and evar in row:
+                rowhash[tvar] = row[evar] - row[svar]
+        if first_var not in summary or row_val < summary[first_var]:
+            summary[first_var] = row_val
+            if is_start:
+                summary[var] = row_val
+        if last_var not in summary or row_val > summary[last_var]:
+            summary[last_var] = row_val
+            if is_end:
+                summary[var] = row_val
+        if names and last_evar in summary and first_svar in summary:
+            summary[tvar] = summary[last_evar] - summary[first_svar]
 
     def __normalize_timeline_val(self, var: str, summary: dict, offset: float):
         """
@@ -708,65 +823,150 @@ class ClusterBusterReporter:
             summary[f'first_{var}'] -= offset
             summary[f'last_{var}'] -= offset
 
-    def __update_accumulator_val(self, var: str, row, summary, rowhash: dict):
+    def __update_accumulator_val(self, accessor: tuple, row, summary, rowhash: dict):
         """
-        Update one accumulator value.  This recurses for deep copy.
-        :param var: Name of variable to update
+        Update one accumulator value.
+        :param accessor: Compiled accumulator variable
         :param row: Input row from JSON
+        :param summary: Summary of report
         :param rowhash: Output row
+        """
+        var, var_counter, var_sq, var_stdev, var_max, var_min, var_avg = accessor
+        if var not in row:
+            return
+        row_val = row[var]
+        if var_counter not in summary:
+            if var not in summary:
+                summary[var] = 0
+            summary[var_counter] = 0
+            summary[var_max] = row_val
+            summary[var_min] = row_val
+            summary[var_avg] = row_val
+            summary[var_sq] = 0
+        total = summary[var] + row_val
+        counter = summary[var_counter] + 1
+        sq = summary[var_sq] + row_val * row_val
+        summary[var] = total
+        summary[var_counter] = counter
+        summary[var_sq] = sq
+        if (row_val > summary[var_max]):
+            summary[var_max] = row_val
+        if (row_val < summary[var_min]):
+            summary[var_min] = row_val
+        avg = total / counter
+        summary[var_avg] = avg
+        if counter >= 2:
+            # From https://www.strchr.com/standard_deviation_in_one_pass
+            if avg ** 2 > (sq / counter):
+                # If the numbers are very close, this is probably an arithmetic rounding problem
+                if (sq / counter) / avg ** 2 < 0.99999999999:
+                    print(f"Warning: taking sqrt of negative number: avg**2 {avg ** 2}, var_sq {(sq / counter)}", file=sys.stderr)
+                summary[var_stdev] = 0
+            else:
+                summary[var_stdev] = ((sq / counter) - (avg ** 2)) ** 0.5
+        else:
+            summary[var_stdev] = 0
+        rowhash[var] = row_val
+
+    def __histogram_bucket_value(self, index: int, sub_bucket_bits: int):
+        """
+        Return the highest value that maps into a histogram bucket.
+        This must match cb_histogram in the pod files.
+        :param index: Bucket index
+        :param sub_bucket_bits: log2 of the number of linear sub-buckets per power of 2
+        """
+        shift = (index >> sub_bucket_bits) - 1
+        if shift <= 0:
+            return index
+        return (((index - (shift << sub_bucket_bits)) + 1) << shift) - 1
+
+    def _histogram_percentiles(self, histogram: dict, percentiles: list):
+        """
+        Compute summary statistics from a histogram
+        :param histogram: Histogram as generated by cb_histogram.as_dict()
+                          or merged by the reporter
+        :param percentiles: List of percentiles (0-100) to compute
+        :return: dict of count, min_sec, mean_sec, max_sec, and p<percentile>_sec
+        """
+        count = histogram['count']
+        answer = {
+            'count': count,
+            'min_sec': histogram['min_ns'] / 1000000000.0,
+            'mean_sec': self._safe_div(histogram['sum_ns'], count, number_only=True) / 1000000000.0,
+            'max_sec': histogram['max_ns'] / 1000000000.0
+            }
+        buckets = histogram['buckets']
+        if isinstance(buckets, dict):
+            buckets = buckets.items()
+        buckets = sorted([(int(index), bcount) for index, bcount in buckets])
+        for pct in percentiles:
+            key = f'p{pct:g}'.replace('.', '')
+            target = count * pct / 100.0
+            seen = 0
+            value = 0
+            for index, bcount in buckets:
+                seen += bcount
+                value = self.__histogram_bucket_value(index, histogram['sub_bucket_bits'])
+                if seen >= target:
+                    break
+            value = min(max(value, histogram['min_ns']), histogram['max_ns'])
+            answer[f'{key}_sec'] = value / 1000000000.0
+        return answer
+
+    def __update_histogram_val(self, accessor: tuple, row, summary, rowhash: dict):
+        """
+        Merge one histogram into the summary.
+        :param accessor: Compiled histogram variable
+        :param row: Input row from JSON
+        :param summary: Summary of report
+        :param rowhash: Output row
+        """
+        var, var_hist, percentiles = accessor
+        if var not in row:
+            return
+        row_val = row[var]
+        if var_hist not in summary:
+            summary[var_hist] = {
+                'sub_bucket_bits': row_val['sub_bucket_bits'],
+                'count': 0,
+                'sum_ns': 0,
+                'min_ns': row_val['min_ns'],
+                'max_ns': row_val['max_ns'],
+                'buckets': {}
+                }
+        merged = summary[var_hist]
+        if merged['sub_bucket_bits'] != row_val['sub_bucket_bits']:
+            raise ValueError(f"Cannot merge histograms {var} with different bucket layouts")
+        if row_val['count'] > 0:
+            if merged['count'] == 0 or row_val['min_ns'] < merged['min_ns']:
+                merged['min_ns'] = row_val['min_ns']
+            if row_val['max_ns'] > merged['max_ns']:
+                merged['max_ns'] = row_val['max_ns']
+        merged['count'] += row_val['count']
+        merged['sum_ns'] += row_val['sum_ns']
+        buckets = merged['buckets']
+        for index, count in row_val['buckets']:
+            buckets[index] = buckets.get(index, 0) + count
+        rowhash[var] = self._histogram_percentiles(row_val, percentiles)
+
+    def __finalize_histogram_val(self, var: str, summary: dict, percentiles: list):
+        """
+        Compute percentiles from a merged histogram.  This recurses for deep copy.
+        :param var: Name of variable to finalize
         :param summary: Summary of report
+        :param percentiles: Percentiles to report
         """
         components = var.split('.', 1)
         if len(components) > 1:
-            if components[0] not in row:
-                return
-            if (isinstance(row[components[0]], list)):
-                for element in row[components[0]]:
-                    self.__update_accumulator_val(components[1], element, summary, rowhash)
-            else:
-                if components[0] not in summary:
-                    summary[components[0]] = {}
-                if components[0] not in rowhash:
-                    rowhash[components[0]] = {}
-                self.__update_accumulator_val(components[1], row[components[0]], summary[components[0]], rowhash[components[0]])
-        else:
-            if var not in row:
-                return
-            row_val = row[var]
-            if var not in summary:
-                summary[var] = 0
-            var_counter = f'{var}_counter'
-            var_sq = f'{var}_sq'
-            var_stdev = f'stdev_{var}'
-            var_max = f'max_{var}'
-            var_min = f'min_{var}'
-            var_avg = f'avg_{var}'
-            if var_counter not in summary:
-                summary[var_counter] = 0
-                summary[var_max] = row_val
-                summary[var_min] = row_val
-                summary[var_avg] = row_val
-                summary[var_sq] = 0
-            summary[var] += row_val
-            summary[var_counter] += 1
-            summary[var_sq] += row_val * row_val
-            if (row_val > summary[var_max]):
-                summary[var_max] = row_val
-            if (row_val < summary[var_min]):
-                summary[var_min] = row_val
-            summary[var_avg] = summary[var] / summary[var_counter]
-            if summary[var_counter] >= 2:
-                # From https://www.strchr.com/standard_deviation_in_one_pass
-                if summary[var_avg] ** 2 > (summary[var_sq] / summary[var_counter]):
-                    # If the numbers are very close, this is probably an arithmetic rounding problem
-                    if (summary[var_sq] / summary[var_counter]) / summary[var_avg] ** 2 < 0.99999999999:
-                        print(f"Warning: taking sqrt of negative number: avg**2 {summary[var_avg] ** 2}, var_sq {(summary[var_sq] / summary[var_counter])}", file=sys.stderr)
-                    summary[var_stdev] = 0
-                else:
-                    summary[var_stdev] = ((summary[var_sq] / summary[var_counter]) - (summary[var_avg] ** 2)) ** 0.5
+            if components[0] in summary:
+                self.__finalize_histogram_val(components[1], summary[components[0]], percentiles)
             else:
-                summary[var_stdev] = 0
-            rowhash[var] = row_val
+                # List components are flattened in the summary
+                self.__finalize_histogram_val(components[1], summary, percentiles)
+        elif f'{var}_histogram' in summary:
+            merged = summary[f'{var}_histogram']
+            merged['buckets'] = sorted([[index, count] for index, count in merged['buckets'].items()])
+            summary[var] = self._histogram_percentiles(merged, percentiles)
 
     def __strip_suffix(self, num):
         n = str(num).strip()
@@ -956,7 +1156,7 @@ class ClusterBusterReporter:
                 'metadata': self._jdata['metadata'],
                 }
         elif self._format.startswith('json-verbose'):
-            answer = deepcopy(self._jdata)
+            answer = dict(self._jdata)
             answer['processed_results'] = {
                 'summary': self._summary,
                 'rows': self._rows
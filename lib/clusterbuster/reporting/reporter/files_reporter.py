@@ -20,13 +20,29 @@ from .ClusterBusterReporter import ClusterBusterReporter
 class files_reporter(ClusterBusterReporter):
     def __init__(self, jdata: dict, report_format: str):
         super().__init__(jdata, report_format)
-        self._file_operations = ['create', 'read', 'remove']
-        self._add_timeline_vars(['create.operation', 'read.operation', 'remove.operation'])
-        self._add_accumulators(['create.user_cpu_time', 'create.system_cpu_time', 'create.cpu_time', 'create.operations',
-                                'read.user_cpu_time', 'read.system_cpu_time', 'read.cpu_time', 'read.operations',
-                                'read.total_files', 'read.data_size', 'read.data_rate',
-                                'remove.user_cpu_time', 'remove.system_cpu_time', 'remove.cpu_time', 'remove.operations',
-                                'summary.total_dirs', 'summary.total_files', 'summary.data_size'])
+        self._mixed_operations = ['create', 'read', 'stat', 'remove']
+        if jdata['metadata']['options']['workloadOptions'].get('files_mixed_duration', 0) > 0:
+            self._file_operations = ['mixed']
+            self._latency_classes = {'mixed': self._mixed_operations}
+            self._add_timeline_vars(['mixed.operation'])
+            self._add_accumulators(['mixed.user_cpu_time', 'mixed.system_cpu_time', 'mixed.cpu_time', 'mixed.operations',
+                                    'summary.total_dirs', 'summary.total_files', 'summary.data_size'] +
+                                   [f'mixed.op_counts.{op}' for op in self._mixed_operations])
+        else:
+            self._file_operations = ['create', 'read', 'remove']
+            self._latency_classes = {
+                'create': ['mkdir', 'open', 'write', 'close'],
+                'read': ['open', 'read', 'close'],
+                'remove': ['unlink', 'rmdir']
+                }
+            self._add_timeline_vars(['create.operation', 'read.operation', 'remove.operation'])
+            self._add_accumulators(['create.user_cpu_time', 'create.system_cpu_time', 'create.cpu_time', 'create.operations',
+                                    'read.user_cpu_time', 'read.system_cpu_time', 'read.cpu_time', 'read.operations',
+                                    'read.total_files', 'read.data_size', 'read.data_rate',
+                                    'remove.user_cpu_time', 'remove.system_cpu_time', 'remove.cpu_time', 'remove.operations',
+                                    'summary.total_dirs', 'summary.total_files', 'summary.data_size'])
+        self._add_histograms([f'{op}.latency.{syscall}'
+                              for op in self._file_operations for syscall in self._latency_classes[op]])
         self._set_header_components(['namespace', 'pod', 'container', 'process_id'])
 
     def __update_report(self, dest: dict, source: dict):
@@ -45,6 +61,48 @@ class files_reporter(ClusterBusterReporter):
                 dest[cop]['Total Files'] = sop['total_files']
                 dest[cop]['Total Data'] = self._prettyprint(sop['data_size'], base=1024, suffix="B", precision=3)
                 dest[cop]['IO Throughput'] = self._prettyprint(sop['data_rate'], precision=3, base=1024, suffix="B/sec")
+            if op == 'mixed':
+                for mop in self._mixed_operations:
+                    dest[cop][f'{mop.capitalize()} Operations/sec'] = \
+                        self._safe_div(sop['op_counts'][mop], sop['operation_elapsed_time'], 0)
+                if 'timeseries' in sop:
+                    dest[cop]['Timeseries'] = {}
+                    for interval in sop['timeseries']:
+                        key = (f"{self._fformat(interval['start'], 0)}-"
+                               f"{self._fformat(interval['start'] + interval['elapsed'], 0)} sec")
+                        dest[cop]['Timeseries'][key] = {}
+                        for mop in self._mixed_operations:
+                            dest[cop]['Timeseries'][key][mop] = self._prettyprint(interval[f'{mop}_rate'], precision=3,
+                                                                                  base=1000, suffix='ops/sec')
+            if 'latency' in sop:
+                dest[cop]['Latency'] = {}
+                for syscall in self._latency_classes[op]:
+                    if syscall in sop['latency'] and sop['latency'][syscall]['count'] > 0:
+                        lat = sop['latency'][syscall]
+                        dest[cop]['Latency'][syscall] = {}
+                        for key in ['mean', 'p50', 'p90', 'p99', 'p999', 'max']:
+                            dest[cop]['Latency'][syscall][key] = self._prettyprint(lat[f'{key}_sec'],
+                                                                                   precision=3, base=1000, suffix='sec')
+
+    def _create_row(self, row: dict):
+        """
+        Sum the steady-state per-interval operation rates across all workers
+        """
+        answer = ClusterBusterReporter._create_row(self, row)
+        if 'mixed' in row and 'timeseries' in row['mixed']:
+            if 'mixed' not in self._summary:
+                self._summary['mixed'] = {}
+            if 'timeseries' not in self._summary['mixed']:
+                self._summary['mixed']['timeseries'] = []
+            timeseries = self._summary['mixed']['timeseries']
+            for idx, interval in enumerate(row['mixed']['timeseries']):
+                if idx >= len(timeseries):
+                    timeseries.append({'start': interval['start'], 'elapsed': interval['elapsed']})
+                    for mop in self._mixed_operations:
+                        timeseries[idx][f'{mop}_rate'] = 0
+                for mop in self._mixed_operations:
+                    timeseries[idx][f'{mop}_rate'] += self._safe_div(interval.get(mop, 0), interval['elapsed'], number_only=True)
+        return answer
 
     def _generate_summary(self, results: dict):
         # I'd like to do this, but if the nodes are out of sync time-wise, this will not
@@ -29,22 +29,110 @@ class fio_reporter(ClusterBusterReporter):
                           'clat_ns.max', 'clat_ns.mean',
                           'lat_ns.max', 'lat_ns.mean']
         accumulators = []
+        histograms = []
         for job in self._job_names:
             for op in self._fio_operations:
                 workload = f'results.{job}.job_results.jobs.{op}'
                 for var in self._fio_vars:
                     accumulators.append(f'{workload}.{var}')
+                histograms.append(f'{workload}.clat_ns.histogram')
             accumulators.append('results.{job}.job_results.jobs.sync.total_ios')
             accumulators.append('results.{job}.job_results.jobs.sync.lat_ns.max')
             accumulators.append('results.{job}.job_results.jobs.sync.lat_ns.mean')
+        accumulators.extend(['file_preparation.elapsed_time', 'file_preparation.bytes_written'])
         self._add_accumulators(accumulators)
+        self._add_histograms(histograms)
         self._set_header_components(['namespace', 'pod', 'container', 'process_id'])
 
+    def __steady_state(self, timeseries: list, tolerance: float = 0.1):
+        """
+        Characterize an I/O rate timeseries.  The steady state rate is the
+        mean over the second half of the intervals; steady state is reached
+        at the start of the first interval after which every interval is
+        within tolerance of that rate.  The burst rate is the highest rate
+        seen before steady state is reached.
+        :param timeseries: List of intervals with io_rate and data_rate
+        :param tolerance: Allowed relative deviation from steady state
+        :return: Steady state information, or None if there is no timeseries
+        """
+        if not timeseries:
+            return None
+        rates = [interval['io_rate'] for interval in timeseries]
+        tail = timeseries[int(len(timeseries) / 2):]
+        steady_io_rate = sum([interval['io_rate'] for interval in tail]) / len(tail)
+        steady_data_rate = sum([interval['data_rate'] for interval in tail]) / len(tail)
+        reached = len(rates)
+        while reached > 0 and abs(rates[reached - 1] - steady_io_rate) <= tolerance * steady_io_rate:
+            reached -= 1
+        burst = max(range(max(reached, 1)), key=lambda idx: rates[idx])
+        return {
+            'intervals': len(rates),
+            'steady_state_io_rate': steady_io_rate,
+            'steady_state_data_rate': steady_data_rate,
+            'burst_io_rate': rates[burst],
+            'burst_data_rate': timeseries[burst]['data_rate'],
+            'time_to_steady_state': timeseries[reached]['start'] if reached < len(rates) else None
+            }
+
+    def _create_row(self, row: dict):
+        """
+        Sum the per-interval I/O rates across all workers, and characterize
+        each worker's burst and steady state throughput
+        """
+        answer = ClusterBusterReporter._create_row(self, row)
+        for job in self._job_names:
+            if job not in row.get('results', {}) or 'timeseries' not in row['results'][job]['job_results']:
+                continue
+            row_timeseries = row['results'][job]['job_results']['timeseries']
+            self._rows[answer]['results'][job]['steady_state'] = self.__steady_state(row_timeseries)
+            summary = self._summary['results'][job]
+            if 'timeseries' not in summary:
+                summary['timeseries'] = []
+            timeseries = summary['timeseries']
+            for idx, interval in enumerate(row_timeseries):
+                if idx >= len(timeseries):
+                    timeseries.append({'start': interval['start'], 'elapsed': interval['elapsed'],
+                                       'total_ios': 0, 'io_rate': 0, 'data_rate': 0, 'lat_mean': 0})
+                merged = timeseries[idx]
+                # Mean latency is weighted by the number of I/Os
+                merged['lat_mean'] = self._safe_div(merged['lat_mean'] * merged['total_ios'] +
+                                                    interval['lat_mean'] * interval['total_ios'],
+                                                    merged['total_ios'] + interval['total_ios'], number_only=True)
+                merged['total_ios'] += interval['total_ios']
+                merged['io_rate'] += interval['io_rate']
+                merged['data_rate'] += interval['data_rate']
+        return answer
+
     def __update_report(self, dest: dict, source: dict, max_key: str, rows: int = 1):
         for job in self._job_names:
             pjob = f'job: {job}'
             if pjob not in dest:
                 dest[pjob] = {}
+            steady_state = source[job].get('steady_state')
+            if steady_state:
+                dest1 = {}
+                dest1['burst_io_rate'] = self._prettyprint(steady_state['burst_io_rate'],
+                                                           precision=3, base=1000, suffix='/sec')
+                dest1['burst_data_rate'] = self._prettyprint(steady_state['burst_data_rate'],
+                                                             precision=3, suffix='B/sec')
+                dest1['steady_state_io_rate'] = self._prettyprint(steady_state['steady_state_io_rate'],
+                                                                  precision=3, base=1000, suffix='/sec')
+                dest1['steady_state_data_rate'] = self._prettyprint(steady_state['steady_state_data_rate'],
+                                                                    precision=3, suffix='B/sec')
+                if steady_state['time_to_steady_state'] is None:
+                    dest1['time_to_steady_state'] = 'not reached'
+                else:
+                    dest1['time_to_steady_state'] = self._prettyprint(steady_state['time_to_steady_state'],
+                                                                      precision=3, base=1000, suffix='sec')
+                dest[pjob]['Steady state'] = dest1
+            if 'timeseries' in source[job]:
+                dest[pjob]['Timeseries'] = {}
+                for interval in source[job]['timeseries']:
+                    dest[pjob]['Timeseries'][f"{interval['start']:.0f}"] = {
+                        'io_rate': self._prettyprint(interval['io_rate'], precision=3, base=1000, suffix='/sec'),
+                        'data_rate': self._prettyprint(interval['data_rate'], precision=3, suffix='B/sec'),
+                        'lat_mean': self._prettyprint(interval['lat_mean'], precision=3, base=1000, suffix='sec')
+                        }
             for op in self._fio_operations:
                 pop = f'operation: {op}'
                 source1 = source[job]['job_results'][op]
@@ -76,11 +164,18 @@ class fio_reporter(ClusterBusterReporter):
                                                          base=1000, precision=3, suffix='sec')
                     dest1['lat_mean'] = self._prettyprint(source1['lat_ns']['mean'] / rows / 1000000000.0,
                                                           base=1000, precision=3, suffix='sec')
+                    histogram = source1['clat_ns'].get('histogram')
+                    if histogram and histogram['count'] > 0:
+                        for pct in ['p50', 'p90', 'p99', 'p999']:
+                            dest1[f'clat_{pct}'] = self._prettyprint(histogram[f'{pct}_sec'],
+                                                                     base=1000, precision=3, suffix='sec')
 
     def _add_summary(self):
         ClusterBusterReporter._add_summary(self)
         for k, v in self._summary['results'].items():
             v['metadata'] = self._jdata['metadata']['workload_metadata']['jobs'][k]
+            if 'timeseries' in v:
+                v['steady_state'] = self.__steady_state(v['timeseries'])
 
     def _generate_summary(self, results: dict):
         # I'd like to do this, but if the nodes are out of sync time-wise, this will not
@@ -91,6 +186,14 @@ class fio_reporter(ClusterBusterReporter):
         for k, v in sample_row['global options'].items():
             if k not in ['rw', 'bs']:
                 results[k] = v
+        if 'file_preparation' in self._summary:
+            prep = self._summary['file_preparation']
+            results['File preparation'] = {
+                'Method': self._jdata['metadata']['options']['workloadOptions'].get('fio_prep_method', 'dd'),
+                'Average time': self._prettyprint(prep['avg_elapsed_time'], precision=3, base=1000, suffix='sec'),
+                'Max time': self._prettyprint(prep['max_elapsed_time'], precision=3, base=1000, suffix='sec'),
+                'Data written': self._prettyprint(prep['bytes_written'], precision=3, suffix='B')
+                }
         results['\nFIO job file'] = base64.b64decode(self._jdata['metadata']['options']['workloadOptions']['fio_job_file']).decode()
         results['\nJobs'] = {}
         self.__update_report(results['\nJobs'], self._summary['results'], 'max_max', int(self._summary['total_instances']))
@@ -98,5 +201,8 @@ class fio_reporter(ClusterBusterReporter):
     def _generate_row(self, results: dict, row: dict):
         ClusterBusterReporter._generate_row(self, results, row)
         result = {}
+        if 'file_preparation' in row:
+            result['File preparation time'] = self._prettyprint(row['file_preparation']['elapsed_time'],
+                                                                precision=3, base=1000, suffix='sec')
         self.__update_report(result, row['results'], 'max')
         self._insert_into(results, [row['namespace'], row['pod'], row['container'], str(row['process_id'])], result)
@@ -20,8 +20,105 @@ from .ClusterBusterReporter import ClusterBusterReporter
 class server_reporter(ClusterBusterReporter):
     def __init__(self, jdata: dict, report_format: str):
         super().__init__(jdata, report_format)
-        self._add_accumulators(['data_sent_bytes', 'passes', 'mean_latency_sec', 'max_latency_sec'])
+        self._add_accumulators(['data_sent_bytes', 'passes', 'mean_latency_sec', 'max_latency_sec',
+                                'target_message_rate', 'achieved_message_rate',
+                                'packets_sent', 'packets_received', 'packets_lost', 'packets_late', 'packet_rate'])
+        self._latency_percentiles = [50, 90, 99, 99.9, 99.99]
+        self._add_histograms(['latency', 'uncorrected_latency', 'setup_latency'], self._latency_percentiles)
+        self._open_loop = jdata['metadata']['options']['workloadOptions'].get('rate_mode', 'closed') != 'closed'
         self._set_header_components(['namespace', 'pod', 'container'])
+        self._server_cpu_vars = ['user_cpu_time', 'system_cpu_time', 'busy_time', 'idle_time',
+                                 'voluntary_context_switches', 'involuntary_context_switches']
+
+    def _create_row(self, row: dict):
+        """
+        Servers running in epoll mode report their own results.  Those
+        are summarized separately rather than being counted as clients.
+        """
+        if 'server' not in row:
+            return ClusterBusterReporter._create_row(self, row)
+        server = row['server']
+        if 'server' not in self._summary:
+            self._summary['server'] = {
+                'mode': server['mode'],
+                'workers': 0,
+                'elapsed_time': 0,
+                'connections': [],
+                'bytes_received': 0,
+                'bytes_sent': 0,
+                'cpu': {var: 0 for var in self._server_cpu_vars}
+                }
+        summary = self._summary['server']
+        summary['workers'] += 1
+        summary['elapsed_time'] = max(summary['elapsed_time'], row['data_elapsed_time'])
+        summary['connections'].extend(server['connections'])
+        summary['bytes_received'] += server['bytes_received']
+        summary['bytes_sent'] += server['bytes_sent']
+        for var in self._server_cpu_vars:
+            summary['cpu'][var] += server['cpu'][var]
+        return None
+
+    def __generate_server_summary(self, results: dict):
+        summary = self._summary['server']
+        connection_bytes = [conn['bytes_received'] + conn['bytes_sent'] for conn in summary['connections']]
+        cpu = summary['cpu']
+        cpu_time = cpu['user_cpu_time'] + cpu['system_cpu_time']
+        result = {}
+        result['Mode'] = summary['mode']
+        result['Workers'] = summary['workers']
+        result['Connections'] = len(connection_bytes)
+        result['Data Received'] = self._prettyprint(summary['bytes_received'],
+                                                    integer=1, precision=3, base=1000, suffix='B')
+        result['Data Sent'] = self._prettyprint(summary['bytes_sent'],
+                                                integer=1, precision=3, base=1000, suffix='B')
+        if connection_bytes:
+            result['Per-connection Data'] = {
+                'min': self._prettyprint(min(connection_bytes), integer=1, precision=3, base=1000, suffix='B'),
+                'avg': self._prettyprint(sum(connection_bytes) / len(connection_bytes),
+                                         integer=1, precision=3, base=1000, suffix='B'),
+                'max': self._prettyprint(max(connection_bytes), integer=1, precision=3, base=1000, suffix='B')
+                }
+        result['CPU'] = {
+            'User CPU': self._prettyprint(cpu['user_cpu_time'], precision=3, base=1000, suffix='sec'),
+            'System CPU': self._prettyprint(cpu['system_cpu_time'], precision=3, base=1000, suffix='sec'),
+            'CPU utilization': self._prettyprint(self._safe_div(cpu_time, summary['elapsed_time']),
+                                                 precision=3, base=100, suffix='%'),
+            'CPU per message': self._prettyprint(self._safe_div(cpu_time * self.__msg_size(), summary['bytes_sent']),
+                                                 precision=3, base=1000, suffix='sec'),
+            'Busy fraction': self._prettyprint(self._safe_div(cpu['busy_time'], cpu['busy_time'] + cpu['idle_time']),
+                                               precision=3, base=100, suffix='%'),
+            'Voluntary context switches': cpu['voluntary_context_switches'],
+            'Involuntary context switches': cpu['involuntary_context_switches']
+            }
+        results['Server'] = result
+
+    def __latency_percentiles(self, latency: dict):
+        """
+        Format round trip time percentiles from a merged histogram
+        """
+        result = {}
+        for pct in self._latency_percentiles:
+            key = 'p' + f'{pct:g}'.replace('.', '')
+            result[f'{pct:g}%'] = self._prettyprint(latency[f'{key}_sec'], precision=3, base=1000, suffix='sec')
+        return result
+
+    def __packet_stats(self, stats: dict):
+        """
+        Format UDP packet counts and loss from a row or the summary
+        """
+        return {
+            'Packets Sent': self._prettyprint(stats['packets_sent'], integer=1, precision=3, base=1000, suffix='pkts'),
+            'Packets Received': self._prettyprint(stats['packets_received'],
+                                                  integer=1, precision=3, base=1000, suffix='pkts'),
+            'Packets Lost': stats['packets_lost'],
+            'Late Replies': stats['packets_late'],
+            'Loss Rate': self._prettyprint(self._safe_div(stats['packets_lost'], stats['packets_sent']),
+                                           precision=3, base=100, suffix='%'),
+            'Packet Rate': self._prettyprint(stats['packet_rate'], precision=3, base=1000, suffix='pkts/sec')
+            }
+
+    def __msg_size(self):
+        return self._jdata['metadata']['options']['workloadOptions'].get('msg_size', 1)
 
     def _generate_summary(self, results: dict):
         # I'd like to do this, but if the nodes are out of sync time-wise, this will not
@@ -41,6 +138,21 @@ class server_reporter(ClusterBusterReporter):
                                                    precision=3, base=1000, suffix='sec')
         results['Max RTT'] = self._prettyprint(self._summary['max_max_latency_sec'],
                                                precision=3, base=1000, suffix='sec')
+        if 'latency' in self._summary and self._summary['latency']['count'] > 0:
+            results['RTT Percentiles'] = self.__latency_percentiles(self._summary['latency'])
+        if 'uncorrected_latency' in self._summary and self._summary['uncorrected_latency']['count'] > 0:
+            results['Uncorrected RTT Percentiles'] = self.__latency_percentiles(self._summary['uncorrected_latency'])
+        if 'setup_latency' in self._summary and self._summary['setup_latency']['count'] > 0:
+            results['Connection Setup Latency'] = self.__latency_percentiles(self._summary['setup_latency'])
+        if self._open_loop and 'target_message_rate' in self._summary:
+            results['Target Message Rate'] = self._prettyprint(self._summary['target_message_rate'],
+                                                               precision=3, base=1000, suffix='msgs/sec')
+            results['Achieved Message Rate'] = self._prettyprint(self._summary['achieved_message_rate'],
+                                                                 precision=3, base=1000, suffix='msgs/sec')
+        if 'packets_sent' in self._summary:
+            results['UDP'] = self.__packet_stats(self._summary)
+        if 'server' in self._summary:
+            self.__generate_server_summary(results)
 
     def _generate_row(self, results: dict, row: dict):
         ClusterBusterReporter._generate_row(self, results, row)
@@ -57,4 +169,17 @@ class server_reporter(ClusterBusterReporter):
                                                   precision=3, base=1000, suffix='sec')
         result['Max RTT'] = self._prettyprint(row['max_latency_sec'],
                                               precision=3, base=1000, suffix='sec')
+        if 'latency' in row and row['latency']['count'] > 0:
+            result['RTT Percentiles'] = self.__latency_percentiles(row['latency'])
+        if 'uncorrected_latency' in row and row['uncorrected_latency']['count'] > 0:
+            result['Uncorrected RTT Percentiles'] = self.__latency_percentiles(row['uncorrected_latency'])
+        if 'setup_latency' in row and row['setup_latency']['count'] > 0:
+            result['Connection Setup Latency'] = self.__latency_percentiles(row['setup_latency'])
+        if self._open_loop and 'target_message_rate' in row:
+            result['Target Message Rate'] = self._prettyprint(row['target_message_rate'],
+                                                              precision=3, base=1000, suffix='msgs/sec')
+            result['Achieved Message Rate'] = self._prettyprint(row['achieved_message_rate'],
+                                                                precision=3, base=1000, suffix='msgs/sec')
+        if 'packets_sent' in row:
+            result['UDP'] = self.__packet_stats(row)
         self._insert_into(results, [row['namespace'], row['pod'], row['container']], result)
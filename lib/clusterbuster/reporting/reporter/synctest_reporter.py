@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+
+# Copyright 2023 Robert Krawitz/Red Hat
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from .ClusterBusterReporter import ClusterBusterReporter
+
+
+class synctest_reporter(ClusterBusterReporter):
+    def __init__(self, jdata: dict, report_format: str):
+        super().__init__(jdata, report_format)
+        self._add_accumulators(['barriers.count', 'barriers.barrier_time', 'barriers.rate'])
+        self._add_histograms(['barriers.latency'], [50, 90, 99, 99.9])
+        self._set_header_components(['namespace', 'pod', 'container', 'process_id'])
+
+    def __iteration_stats(self, timeseries: dict):
+        """
+        Characterize the time taken by the barriers of each iteration
+        """
+        times = sorted(timeseries['elapsed'])
+        if not times:
+            return None
+        middle = int(len(times) / 2)
+        if len(times) % 2:
+            median = times[middle]
+        else:
+            median = (times[middle - 1] + times[middle]) / 2
+        return {
+            'iterations': len(times),
+            'min': times[0],
+            'median': median,
+            'max': times[-1],
+            'slowest_iteration': timeseries['elapsed'].index(times[-1])
+            }
+
+    def _create_row(self, row: dict):
+        """
+        Merge the per-iteration timeseries across all workers.  An
+        iteration is complete only when its slowest worker is done, so
+        take the maximum of each iteration over the workers.
+        """
+        answer = ClusterBusterReporter._create_row(self, row)
+        if 'timeseries' in row:
+            if 'timeseries' not in self._summary:
+                self._summary['timeseries'] = {'start': [], 'elapsed': [], 'max_latency_sec': []}
+            timeseries = self._summary['timeseries']
+            row_timeseries = row['timeseries']
+            for idx, elapsed in enumerate(row_timeseries['elapsed']):
+                if idx >= len(timeseries['elapsed']):
+                    timeseries['start'].append(row_timeseries['start'][idx])
+                    timeseries['elapsed'].append(0)
+                    timeseries['max_latency_sec'].append(0)
+                timeseries['start'][idx] = min(timeseries['start'][idx], row_timeseries['start'][idx])
+                timeseries['elapsed'][idx] = max(timeseries['elapsed'][idx], elapsed)
+                timeseries['max_latency_sec'][idx] = max(timeseries['max_latency_sec'][idx],
+                                                         row_timeseries['max_latency_sec'][idx])
+            self._rows[answer]['iteration_time'] = self.__iteration_stats(row_timeseries)
+        return answer
+
+    def _add_summary(self):
+        ClusterBusterReporter._add_summary(self)
+        if 'timeseries' in self._summary:
+            self._summary['iteration_time'] = self.__iteration_stats(self._summary['timeseries'])
+
+    def __update_report(self, dest: dict, source: dict, barriers: int, barrier_rate: float):
+        dest['Barriers'] = barriers
+        dest['Barriers/sec'] = self._prettyprint(barrier_rate, precision=3, base=0)
+        if 'barriers' in source and 'latency' in source['barriers']:
+            dest['Barrier latency'] = {}
+            for key in ['mean', 'p50', 'p90', 'p99', 'p999', 'max']:
+                dest['Barrier latency'][key] = self._prettyprint(source['barriers']['latency'][f'{key}_sec'],
+                                                                 precision=3, base=1000, suffix='sec')
+        stats = source.get('iteration_time')
+        if stats:
+            dest['Iteration barrier time'] = {
+                'iterations': stats['iterations'],
+                'min': self._prettyprint(stats['min'], precision=3, base=1000, suffix='sec'),
+                'median': self._prettyprint(stats['median'], precision=3, base=1000, suffix='sec'),
+                'max': self._prettyprint(stats['max'], precision=3, base=1000, suffix='sec'),
+                'slowest iteration': stats['slowest_iteration']
+                }
+
+    def _generate_summary(self, results: dict):
+        ClusterBusterReporter._generate_summary(self, results)
+        if 'barriers' not in self._summary:
+            return
+        # Every worker takes part in every barrier, so the number of
+        # barriers is the number performed by any one worker.
+        barriers = self._summary['barriers']['max_count']
+        self._summary['barriers']['barriers_sec'] = self._safe_div(barriers, self._summary['data_run_interval'],
+                                                                   number_only=True)
+        self.__update_report(results, self._summary, barriers, self._summary['barriers']['barriers_sec'])
+
+    def _generate_row(self, results: dict, row: dict):
+        ClusterBusterReporter._generate_row(self, results, row)
+        result = {}
+        result['Elapsed Time'] = self._fformat(row['data_elapsed_time'], 3)
+        if 'barriers' in row:
+            self.__update_report(result, row, row['barriers']['count'], row['barriers']['rate'])
+        self._insert_into(results, [row['namespace'], row['pod'], row['container'], row['process_id']], result)
@@ -50,6 +50,7 @@ class sysbench_reporter(ClusterBusterReporter):
             timeline_vars.append(f'{workload}.op')
             for var in self._sysbench_vars_to_copy:
                 vars_to_copy.append(f'{workload}.{re.sub(r":.*", "", var)}')
+        accumulators.extend(['file_preparation.prepare_time', 'file_preparation.cleanup_time'])
         self._add_accumulators(accumulators)
         self._add_fields_to_copy(vars_to_copy)
         self._add_timeline_vars(timeline_vars)
@@ -69,6 +70,81 @@ class sysbench_reporter(ClusterBusterReporter):
         self._add_accumulators(accumulators)
         self._add_fields_to_copy(vars_to_copy)
 
+    def __interval_stats(self, timeseries: dict):
+        """
+        Characterize the per-interval throughput reported by sysbench.
+        An interval with no throughput is counted as a stall.
+        """
+        rates = sorted(timeseries['throughput'])
+        if not rates:
+            return None
+        middle = int(len(rates) / 2)
+        if len(rates) % 2:
+            median = rates[middle]
+        else:
+            median = (rates[middle - 1] + rates[middle]) / 2
+        return {
+            'intervals': len(rates),
+            'units': timeseries['throughput_units'],
+            'min': rates[0],
+            'median': median,
+            'max': rates[-1],
+            'stalls': len([rate for rate in rates if rate <= 0])
+            }
+
+    def _create_row(self, row: dict):
+        """
+        Sum the per-interval throughput across all workers, and
+        characterize each worker's interval throughput
+        """
+        answer = ClusterBusterReporter._create_row(self, row)
+        for op in self._sysbench_operations:
+            if op not in row.get('workloads', {}) or 'timeseries' not in row['workloads'][op]:
+                continue
+            row_timeseries = row['workloads'][op]['timeseries']
+            stats = self.__interval_stats(row_timeseries)
+            if stats is None:
+                continue
+            self._rows[answer]['workloads'][op]['interval_throughput'] = stats
+            summary = self._summary['workloads'][op]
+            if 'timeseries' not in summary:
+                summary['timeseries'] = {'throughput_units': row_timeseries['throughput_units'], 'time': [], 'throughput': []}
+                summary['worker_stalls'] = 0
+            timeseries = summary['timeseries']
+            summary['worker_stalls'] += stats['stalls']
+            for idx, rate in enumerate(row_timeseries['throughput']):
+                if idx >= len(timeseries['throughput']):
+                    timeseries['time'].append(row_timeseries['time'][idx])
+                    timeseries['throughput'].append(0)
+                timeseries['throughput'][idx] += rate
+        return answer
+
+    def _add_summary(self):
+        ClusterBusterReporter._add_summary(self)
+        for op in self._sysbench_operations:
+            summary = self._summary['workloads'].get(op, {})
+            if 'timeseries' in summary:
+                summary['interval_throughput'] = self.__interval_stats(summary['timeseries'])
+                # Stalls of individual workers are hidden when throughput is
+                # summed, so report the total of the workers' stalls instead
+                summary['interval_throughput']['stalls'] = summary['worker_stalls']
+
+    def __report_intervals(self, dest: dict, source: dict):
+        stats = source.get('interval_throughput')
+        if not stats:
+            return
+        if stats['units'] == 'B/sec':
+            base = 1024
+        else:
+            base = 1000
+        dest['Interval throughput'] = {
+            'intervals': stats['intervals'],
+            'min': self._prettyprint(stats['min'], precision=3, base=base, suffix=stats['units']),
+            'median': self._prettyprint(stats['median'], precision=3, base=base, suffix=stats['units']),
+            'max': self._prettyprint(stats['max'], precision=3, base=base, suffix=stats['units']),
+            'stalls': stats['stalls']
+            }
+
     def __update_report(self, dest: dict, source: dict, sample_row: dict = None):
         if self._is_fileio:
             self.__update_report_fileio(dest, source, sample_row)
@@ -92,6 +168,7 @@ class sysbench_reporter(ClusterBusterReporter):
             dest[pop]['events_rate'] = self._prettyprint(self._safe_div(source[op]['total_events'],
                                                                         self._summary['data_run_interval']),
                                                          precision=3, base=1000, suffix='events/sec')
+            self.__report_intervals(dest[pop], source[op])
 
     def __update_report_fileio(self, dest: dict, source: dict, sample_row: dict = None):
         if sample_row is None:
@@ -124,12 +201,24 @@ class sysbench_reporter(ClusterBusterReporter):
             dest[pop]['write data rate'] = self._prettyprint(self._safe_div(source[op]['blocksize'] * source[op]['write_ops'],
                                                                             source[op]['elapsed_time']),
                                                              precision=3, base=1024, suffix='B/sec')
+            self.__report_intervals(dest[pop], source[op])
 
     def _generate_summary(self, results: dict):
         # I'd like to do this, but if the nodes are out of sync time-wise, this will not
         # function correctly.
         ClusterBusterReporter._generate_summary(self, results)
         sample_row = self._jdata['Results']['worker_results'][0]['workloads']
+        if 'file_preparation' in self._summary:
+            prep = self._summary['file_preparation']
+            sample_prep = self._jdata['Results']['worker_results'][0]['file_preparation']
+            results['File preparation'] = {
+                'Reuse files': sample_prep['reuse_files'],
+                'Prepare count': sample_prep['prepare_count'],
+                'Average prepare time': self._prettyprint(prep['avg_prepare_time'], precision=3, base=1000, suffix='sec'),
+                'Max prepare time': self._prettyprint(prep['max_prepare_time'], precision=3, base=1000, suffix='sec'),
+                'Average cleanup time': self._prettyprint(prep['avg_cleanup_time'], precision=3, base=1000, suffix='sec'),
+                'Max cleanup time': self._prettyprint(prep['max_cleanup_time'], precision=3, base=1000, suffix='sec')
+                }
         self.__update_report(results, self._summary['workloads'], sample_row)
 
     def _generate_row(self, results: dict, row: dict):
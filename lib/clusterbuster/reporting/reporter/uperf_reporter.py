@@ -28,7 +28,7 @@ class uperf_reporter(ClusterBusterReporter):
         for op in self._uperf_operations:
             for v in ['avg', 'max']:
                 self._uperf_vars.append(f'{op}.time_{v}')
-        accumulators = []
+        accumulators = ['server_wait_time']
         for job in self._job_names:
             fields_to_copy.append(f'results.{job}.status')
             workload = f'results.{job}.summary'
@@ -80,11 +80,18 @@ class uperf_reporter(ClusterBusterReporter):
             results['Failed jobs'] = {}
             for failure in failures:
                 results['Failed jobs'][failure] = sample["results"][failure]["status"]["message"]
+        if 'server_wait_time' in self._summary:
+            results['Server Wait Time'] = {
+                'avg': self._prettyprint(self._summary['avg_server_wait_time'], precision=3, base=1000, suffix='sec'),
+                'max': self._prettyprint(self._summary['max_server_wait_time'], precision=3, base=1000, suffix='sec')
+                }
         results['\nJob Detail'] = {}
         self.__update_report(results['\nJob Detail'], self._summary['results'], 'max_max', int(self._summary['total_instances']))
 
     def _generate_row(self, results: dict, row: dict):
         ClusterBusterReporter._generate_row(self, results, row)
         result = {}
+        if 'server_wait_time' in row:
+            result['Server Wait Time'] = self._prettyprint(row['server_wait_time'], precision=3, base=1000, suffix='sec')
         self.__update_report(result, row['results'], 'max')
         self._insert_into(results, [row['namespace'], row['pod'], row['container']], result)